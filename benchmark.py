@@ -0,0 +1,247 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+
+def generate_source(seed=0, functions=20, statements=30, depth=3, typedefs=3, pointer_density=0.3):
+    # seeded synthetic C++ in the shape of the lab files: typedef chains, prototypes, nested loops and branches,
+    # *(a + i) style pointer arithmetic, and the trailer line naming every function
+    rng = random.Random(seed)
+    lines = ['#include <iostream>', 'using namespace std;']
+    types = ['int']
+    for i in range(typedefs):
+        lines.append(f'typedef {types[-1]}{"*" if i else ""} t{i};')
+        types.append(f't{i}')
+    pointer = types[-1] if typedefs > 1 else 'int*'
+
+    names = [f'func{i}' for i in range(functions)]
+    for name in names:
+        lines.append(f'void {name}({pointer} a, int n, int m);')
+
+    def expression(variables):
+        left, right = rng.choice(variables), rng.choice(variables)
+        if rng.random() < pointer_density:
+            return f'*(a + {left}) + {right} * {rng.randint(1, 9)}'
+        return f'{left} {rng.choice("+-*")} {right} - {rng.randint(0, 99)}'
+
+    def block(level, variables, budget, indent):
+        body = []
+        pad = '\t' * indent
+        while budget > 0:
+            budget -= 1
+            choice = rng.random()
+            if level < depth and choice < 0.25:
+                var = f'i{level}'
+                body.append(f'{pad}for (int {var} = 0; {var} < n; {var}++) {{')
+                inner = rng.randint(1, max(1, budget // 2))
+                body += block(level + 1, variables + [var], inner, indent + 1)
+                body.append(f'{pad}}}')
+                budget -= inner
+            elif level < depth and choice < 0.4:
+                body.append(f'{pad}if ({rng.choice(variables)} > {expression(variables)}) {{')
+                inner = rng.randint(1, max(1, budget // 2))
+                body += block(level + 1, variables, inner, indent + 1)
+                body.append(f'{pad}}} else {{')
+                body += block(level + 1, variables, 1, indent + 1)
+                body.append(f'{pad}}}')
+                budget -= inner
+            elif level < depth and choice < 0.45:
+                body.append(f'{pad}while (m > {rng.choice(variables)}) {{')
+                body += block(level + 1, variables, 1, indent + 1)
+                body.append(f'{pad}\tm--;')
+                body.append(f'{pad}}}')
+            elif rng.random() < pointer_density:
+                body.append(f'{pad}*(*(a + {rng.choice(variables)}) + {rng.choice(variables)}) = {expression(variables)};')
+            else:
+                body.append(f'{pad}k = {expression(variables)};')
+        return body
+
+    for name in names:
+        lines += [f'void {name}({pointer} a, int n, int m)', '{', '\tint k = 0;']
+        lines += block(0, ['k', 'n', 'm'], statements, 1)
+        lines.append('}')
+    lines.append(' '.join(names))
+    return '\n'.join(lines) + '\n'
+
+
+def measure(func, repeat):
+    # min and median of repeat runs, the last result is returned for the next stage
+    runs = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        runs.append(time.perf_counter() - started)
+    return {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}, result
+
+
+def run_benchmarks(source, repeat=3, threads=(1, 2, 4)):
+    from drow import FlowchartRenderer
+    from parser.binary import BinaryTree, write_binary_tree
+    from parser.flowchart import build_flowcharts
+    from parser.parser import get_parser, parse_many, parserCPP, tree_to_json, write_tree
+    from parser.simplify import Simplifier, read_trailer
+    from parser.symbols import build_symbols
+
+    data = source.encode('utf8')
+    lines = source.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    code = '\n'.join(lines[:-1]).encode('utf8')
+    stages = {}
+
+    stages['parserCPP'], _ = measure(lambda: parserCPP(code), repeat)
+    stages['parse'], tree = measure(lambda: get_parser().parse(code), repeat)
+    stages['tree_to_json'], _ = measure(lambda: tree_to_json(tree.root_node), repeat)
+
+    # the same corpus parsed as several sources, once per thread count, shows how parse_many scales
+    sources = [code] * max(8, *threads)
+    for workers in threads:
+        stages[f'parse_many x{workers}'], _ = measure(lambda: parse_many(sources, workers), repeat)
+
+    class Discard:
+        def write(self, text):
+            pass
+
+    stages['write_tree'], _ = measure(lambda: write_tree(tree.root_node, Discard()), repeat)
+
+    # the binary tree is written once more to memory and opened in place, as a render worker would open the file
+    stages['write_binary_tree'], _ = measure(lambda: write_binary_tree(tree.root_node, code, Discard()), repeat)
+    binary = io.BytesIO()
+    write_binary_tree(tree.root_node, code, binary)
+    stages['open binary tree'], _ = measure(lambda: BinaryTree(binary.getbuffer()).root_node, repeat)
+
+    # every rule is timed on its own with the pipeline's profiling on, the plain run gives the total
+    func_mother, save_pointer = read_trailer(lines[-1])
+    stages['symbols'], symbols = measure(lambda: build_symbols(code), repeat)
+    typedefs = symbols.type_names()
+
+    def simplify(profile=False):
+        simplifier = Simplifier(func_mother, save_pointer, profile, typedefs)
+        return simplifier, list(simplifier.iter_simplified(lines[:-1]))
+
+    stages['simplify'], (simplifier, simplified) = measure(simplify, repeat)
+    stages['select_functions'], _ = measure(lambda: simplifier.select_functions(simplified), repeat)
+    profiled, _ = simplify(profile=True)
+    rules = {name: {'seconds': seconds, 'hits': hits} for name, seconds, hits in profiled.iter_rules()}
+
+    stages['flowcharts'], charts = measure(lambda: build_flowcharts(data), repeat)
+    renderers = [FlowchartRenderer(chart) for chart in charts]
+
+    def layout():
+        for renderer in renderers:
+            renderer.layout()
+
+    def draw():
+        for renderer in renderers:
+            for _ in renderer.iter_svg(relayout=False):
+                pass
+
+    stages['layout'], _ = measure(layout, repeat)
+    stages['draw'], _ = measure(draw, repeat)
+
+    return {
+        'corpus': {
+            'bytes': len(data),
+            'lines': len(lines),
+            'functions': len(charts),
+            'blocks': sum(len(renderer.blocks) for renderer in renderers),
+            'parse_many sources': len(sources),
+        },
+        'stages': stages,
+        'rules': rules,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, results, threshold=0.1):
+    # stage name -> (old, new, ratio) on the min times, regressions are the ones slower than 1 + threshold
+    changes = {}
+    for stage, timing in results['stages'].items():
+        old = baseline.get('stages', {}).get(stage)
+        if old and old['min'] > 0:
+            changes[stage] = (old['min'], timing['min'], timing['min'] / old['min'])
+    regressions = [stage for stage, (_, _, ratio) in changes.items() if ratio > 1 + threshold]
+    return changes, regressions
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description='Time parsing, simplification and rendering on a seeded synthetic corpus')
+    arguments.add_argument('--seed', type=int, default=0)
+    arguments.add_argument('--functions', type=int, default=20, help='functions in the corpus')
+    arguments.add_argument('--statements', type=int, default=30, help='statements per function body')
+    arguments.add_argument('--depth', type=int, default=3, help='deepest nesting of loops and branches')
+    arguments.add_argument('--typedefs', type=int, default=3, help='length of the typedef chain')
+    arguments.add_argument('--pointer-density', type=float, default=0.3, help='share of statements with pointer arithmetic')
+    arguments.add_argument('--repeat', type=int, default=3, help='runs per stage, min and median are reported')
+    arguments.add_argument('--threads', default='1,2,4', help='comma-separated thread counts for parse_many')
+    arguments.add_argument('-o', '--output', default='output/bench.json', help='JSON results')
+    arguments.add_argument('--source', help='also write the generated corpus here')
+    arguments.add_argument('--compare', help='earlier results JSON to compare the min times with')
+    arguments.add_argument('--threshold', type=float, default=0.1, help='slowdown counted as a regression')
+    args = arguments.parse_args(argv)
+
+    params = {
+        'seed': args.seed,
+        'functions': args.functions,
+        'statements': args.statements,
+        'depth': args.depth,
+        'typedefs': args.typedefs,
+        'pointer_density': args.pointer_density,
+    }
+    source = generate_source(**params)
+    if args.source:
+        with open(args.source, 'w', encoding='utf-8') as f:
+            f.write(source)
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'params': params,
+        'repeat': args.repeat,
+        **run_benchmarks(source, args.repeat, [int(count) for count in args.threads.split(',')]),
+    }
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+
+    corpus = results['corpus']
+    print(f"{corpus['lines']} lines, {corpus['functions']} functions, {corpus['blocks']} blocks")
+    for stage, timing in results['stages'].items():
+        print(f"{stage:>18}: {timing['min'] * 1000:9.2f} ms")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print('warning: the baseline was run with different corpus parameters', file=sys.stderr)
+        changes, regressions = compare(baseline, results, args.threshold)
+        for stage, (old, new, ratio) in changes.items():
+            print(f"{stage:>18}: {old * 1000:9.2f} -> {new * 1000:9.2f} ms  x{ratio:.2f}")
+        if regressions:
+            print(f"regressions: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from importlib import metadata
+
+
+# every module whose code shapes a cached result: the AST, the simplifier and its typedef lookup,
+# the function split of cached_functions, the flowchart builder and the SVG renderer
+TOOL_FILES = (
+    'parser/parser.py', 'parser/simplify.py', 'parser/symbols.py', 'parser/document.py', 'parser/flowchart.py', 'drow.py',
+)
+
+
+def tool_version():
+    # results are only reused by the same code and the same grammar
+    digest = hashlib.sha256()
+    root = os.path.dirname(os.path.abspath(__file__))
+    for name in TOOL_FILES:
+        with open(os.path.join(root, name), 'rb') as f:
+            digest.update(f.read())
+    for package in ('tree-sitter', 'tree-sitter-cpp'):
+        try:
+            digest.update(metadata.version(package).encode())
+        except metadata.PackageNotFoundError:
+            pass
+    return digest.hexdigest()[:16]
+
+
+class ResultCache:
+    """Content-addressed results on disk, least recently used ones are evicted past max_bytes"""
+
+    def __init__(self, directory='output/cache', max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.version = tool_version()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = self.misses = 0
+        self._load()
+
+    def _load(self):
+        found = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                stat = os.stat(os.path.join(root, name))
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.size += size
+
+    def key(self, kind, data, **params):
+        digest = hashlib.sha256()
+        digest.update(f'{kind}\0{self.version}\0{json.dumps(params, sort_keys=True)}\0'.encode())
+        digest.update(data)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = f.read()
+        except FileNotFoundError:
+            self.size -= self.entries.pop(key, 0)
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        if key not in self.entries:
+            self.size += len(value)
+        self.entries[key] = len(value)
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{os.getpid()}.tmp'
+        with open(temp, 'wb') as f:
+            f.write(value)
+        os.replace(temp, path)
+        self.size += len(value) - self.entries.pop(key, 0)
+        self.entries[key] = len(value)
+        self._evict()
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.size -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def memoize(self, kind, data, compute, **params):
+        key = self.key(kind, data, **params)
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+
+def cached_ast(cache, source, **options):
+    # tree-sitter JSON text of the source, options as for parserCPP_to_stream
+    def compute():
+        import io
+
+        from parser.parser import parserCPP_to_stream
+
+        buffer = io.StringIO()
+        parserCPP_to_stream(source, buffer, **options)
+        return buffer.getvalue().encode('utf8')
+
+    return cache.memoize('ast', source, compute, **options).decode('utf8')
+
+
+def cached_simplified(cache, text):
+    def compute():
+        from parser.simplify import simplify_source
+
+        return '\n'.join(simplify_source(text)).encode('utf8')
+
+    value = cache.memoize('simplified', text.encode('utf8'), compute).decode('utf8')
+    return value.split('\n') if value else []
+
+
+def split_functions(source, names=None):
+    # (name, node, typedefs, text) per top-level function of one parse; typedefs is the file's typedef prelude
+    from parser.document import function_name
+    from parser.parser import get_parser
+    from parser.symbols import SymbolTable
+
+    if isinstance(source, str):
+        source = source.encode('utf8')
+    tree = get_parser().parse(source)
+    # whole type_definition texts, a multi-line typedef struct { ... } Name; is kept in one piece
+    ranges = dict.fromkeys((symbol.start_byte, symbol.end_byte) for symbol in SymbolTable.from_tree(tree).of_kind('typedef'))
+    typedefs = b'\n'.join(source[start:end] for start, end in ranges)
+    for node in tree.root_node.named_children:
+        if node.type != 'function_definition':
+            continue
+        name = function_name(node)
+        if name is None or names is not None and name not in names:
+            continue
+        yield name, node, typedefs, source[node.start_byte:node.end_byte]
+
+
+def cached_functions(cache, source, names=None, save_pointer=False):
+    # simplified lines per top-level function, each one keyed by its own text and the file's typedefs,
+    # so an edit in one function leaves the others' entries valid
+    from parser.simplify import simplify_source
+
+    trailer = ' PTR' if save_pointer else ''
+    results = {}
+    for name, _, typedefs, text in split_functions(source, names):
+        def compute():
+            unit = b'\n'.join((typedefs, text, (name + trailer).encode('utf8'))).decode('utf8')
+            return '\n'.join(simplify_source(unit)).encode('utf8')
+
+        value = cache.memoize('function', typedefs + b'\0' + text, compute, name=name, save_pointer=save_pointer)
+        results[name] = value.decode('utf8').split('\n') if value else []
+    return results
+
+
+def renderer_params(renderer):
+    return {name: value for name, value in vars(renderer).items() if isinstance(value, (int, float, str))}
+
+
+def cached_svg(cache, json_data, renderer_class=None):
+    if renderer_class is None:
+        from drow import FlowchartRenderer as renderer_class
+
+    renderer = renderer_class(json_data)
+    data = json.dumps(json_data, sort_keys=True, ensure_ascii=False).encode('utf8')
+    params = renderer_params(renderer)
+    params['renderer'] = renderer_class.__name__
+    return cache.memoize('svg', data, lambda: renderer.generate_svg().encode('utf8'), **params).decode('utf8')
+
+
+def cached_function_svgs(cache, source, names=None, renderer_class=None):
+    # flowchart SVG per top-level function, keyed like cached_functions: a hit skips building the flowchart
+    # as well as drawing it, so an edit in one function rebuilds only that chart
+    from parser.flowchart import FlowchartBuilder
+
+    if renderer_class is None:
+        from drow import FlowchartRenderer as renderer_class
+
+    params = renderer_params(renderer_class(None))
+    params['renderer'] = renderer_class.__name__
+    results = {}
+    for name, node, typedefs, text in split_functions(source, names):
+        def compute():
+            return renderer_class(FlowchartBuilder().build(node)).generate_svg().encode('utf8')
+
+        value = cache.memoize('function svg', typedefs + b'\0' + text, compute, name=name, **params)
+        results[name] = value.decode('utf8')
+    return results
@@ -1,39 +1,344 @@
+import heapq
 import json
 import math
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
 from dataclasses import dataclass
 from typing import List, Dict, Tuple
 
+import tracing
+
+# Ширины глифов в тысячных долях кегля (метрики Arial), сгруппированы по ширине
+GLYPH_ADVANCES = {
+    "Arial": {
+        191: "'", 222: "ijl", 260: "|", 278: " !,./:;I[\\]ft", 333: "()-`r", 334: "{}", 355: '"',
+        365: "г", 389: "*", 438: "к", 458: "зт", 469: "^", 500: "Jcksvxyzсух", 510: "э", 521: "чь",
+        531: "в", 542: "Гпя", 552: "н", 556: "#$0123456789?L_abdeghnopquаеоёр", 559: "ий", 573: "бц",
+        583: "Кдл", 584: "+<=>~", 604: "З", 611: "FTZТ", 625: "ъ", 635: "У", 656: "БЛЬ",
+        667: "&ABEKPSVXYАВЕЁРХЧ", 669: "ж", 677: "Д", 688: "м", 719: "ИЙПЭы", 722: "CDHNRUwНСЯ",
+        740: "Ц", 750: "ю", 760: "Ф", 778: "GOQО", 792: "Ъ", 802: "ш", 823: "фщ", 833: "MmМ",
+        885: "Ы", 889: "%", 917: "Ш", 923: "Ж", 938: "Щ", 944: "W", 1010: "Ю", 1015: "@",
+    },
+}
+DEFAULT_ADVANCE = 556
+
+
+# Применяет на странице патч apply_changes: элементы ищутся по id, фрагмент SVG разбирается в пространстве имён SVG
+PATCH_SCRIPT = '''
+    <script>
+    function applyFlowchartPatch(patch) {
+        const svg = document.getElementById("flowchart");
+        for (const op of patch) {
+            if (op.op === "size") {
+                svg.setAttribute("width", op.width);
+                svg.setAttribute("height", op.height);
+                continue;
+            }
+            const old = document.getElementById(op.id);
+            if (op.op === "remove") {
+                if (old) old.remove();
+                continue;
+            }
+            const doc = new DOMParser().parseFromString('<svg xmlns="http://www.w3.org/2000/svg">' + op.svg + '</svg>', "image/svg+xml");
+            const element = document.importNode(doc.documentElement.firstElementChild, true);
+            if (old) old.replaceWith(element);
+            else document.getElementById(op.parent).appendChild(element);
+        }
+    }
+    </script>
+'''
+
+
+@lru_cache(maxsize=None)
+def glyph_table(font):
+    """Таблица ширин символов шрифта: символ -> тысячные доли кегля; шрифт без таблицы меряется по Arial"""
+    advances = GLYPH_ADVANCES.get(font, GLYPH_ADVANCES["Arial"])
+    return {char: advance for advance, chars in advances.items() for char in chars}
+
+
+def glyph_advance(char, table):
+    advance = table.get(char)
+    if advance is None:
+        # Иероглифы и прочие широкие символы занимают полный кегль
+        advance = table[char] = 1000 if unicodedata.east_asian_width(char) in "WF" else DEFAULT_ADVANCE
+    return advance
+
+
+def text_width(text, font="Arial", size=12):
+    """Ширина строки в пикселях"""
+    table = glyph_table(font)
+    return sum(glyph_advance(char, table) for char in text) * size / 1000
+
+
+@dataclass(frozen=True)
+class TextLayout:
+    lines: Tuple[str, ...]
+    width: float
+    height: float
+
+
+@lru_cache(maxsize=8192)
+def layout_text(text, max_width=180, font="Arial", size=12):
+    """Разбивает текст на строки не шире max_width, одна подпись считается один раз"""
+    if not text:
+        return TextLayout((), 80, 40)
+    
+    space = text_width(" ", font, size)
+    lines = []
+    line_widths = []
+    current_line = []
+    current_width = 0
+    
+    for word in text.split():
+        word_width = text_width(word, font, size)
+        if not current_line:
+            current_line, current_width = [word], word_width
+        elif current_width + space + word_width <= max_width:
+            current_line.append(word)
+            current_width += space + word_width
+        else:
+            lines.append(" ".join(current_line))
+            line_widths.append(current_width)
+            current_line, current_width = [word], word_width
+    
+    if current_line:
+        lines.append(" ".join(current_line))
+        line_widths.append(current_width)
+    
+    height = len(lines) * 20 + 20
+    width = max(line_widths) if lines else 80
+    width = min(width + 40, max_width)
+    
+    return TextLayout(tuple(lines), width, height)
+
 @dataclass
 class Point:
     x: float
     y: float
 
-@dataclass
+def _column(name):
+    """Свойство Block, читающее и пишущее один столбец хранилища"""
+    def get(self):
+        return getattr(self.store, name)[self.index]
+    
+    def set(self, value):
+        getattr(self.store, name)[self.index] = value
+    
+    return property(get, set)
+
+def _escape_attribute(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+def _block_element_id(block_id):
+    return "block-" + _escape_attribute(block_id)
+
+def _edge_element_id(block_id, is_true_branch):
+    """Линия называется по блоку, из которого выходит, и ветке: у блока не больше одной линии на ветку"""
+    return f'edge-{_escape_attribute(block_id)}-{"t" if is_true_branch else "f"}'
+
+def _link_targets(block_data):
+    return block_data.get("next"), block_data.get("true"), block_data.get("false")
+
+class BlockStore:
+    """Блоки по столбцам: номер блока - индекс в каждом массиве, строковые id переводятся в номера"""
+    
+    def __init__(self):
+        self.ids = []
+        self.index = {}
+        self.type_names = []
+        self.type_codes = {}
+        self.types = array("B")
+        self.labels = []
+        self.conditions = []
+        self.texts = []
+        
+        # Связи: номер следующего блока, -1 - связи нет
+        self.next_true = array("i")
+        self.next_false = array("i")
+        
+        # Координаты и размеры
+        self.x = array("d")
+        self.y = array("d")
+        self.width = array("d")
+        self.height = array("d")
+        self.layer = array("i")
+    
+    @classmethod
+    def from_flowchart(cls, flowchart):
+        store = cls()
+        for block_id, block_data in flowchart.items():
+            store.add(block_id, block_data["type"], block_data.get("label", ""), block_data.get("condition", ""))
+        
+        # Связи разрешаются, когда известны номера всех блоков; ссылка на несуществующий блок не рисуется
+        for i, block_data in enumerate(flowchart.values()):
+            if "next" in block_data:
+                store.next_true[i] = store.index.get(block_data["next"], -1)
+            elif "true" in block_data and "false" in block_data:
+                store.next_true[i] = store.index.get(block_data["true"], -1)
+                store.next_false[i] = store.index.get(block_data["false"], -1)
+        return store
+    
+    def add(self, block_id, block_type, label="", condition=""):
+        i = self.index[block_id] = len(self.ids)
+        self.ids.append(block_id)
+        self.types.append(self.code(block_type, create=True))
+        self.labels.append(label)
+        self.conditions.append(condition)
+        self.texts.append(None)
+        self.next_true.append(-1)
+        self.next_false.append(-1)
+        for column in (self.x, self.y, self.width, self.height):
+            column.append(0)
+        self.layer.append(0)
+        return i
+    
+    def code(self, block_type, create=False):
+        """Номер типа блока, -1 для типа, которого в схеме нет"""
+        code = self.type_codes.get(block_type)
+        if code is None:
+            if not create:
+                return -1
+            code = self.type_codes[block_type] = len(self.type_names)
+            self.type_names.append(block_type)
+        return code
+    
+    def block_type(self, i):
+        return self.type_names[self.types[i]]
+    
+    # Точки подключения линий считаются по запросу
+    def top_center(self, i):
+        return Point(self.x[i], self.y[i])
+    
+    def bottom_center(self, i):
+        return Point(self.x[i], self.y[i] + self.height[i])
+    
+    def left_center(self, i):
+        return Point(self.x[i] - self.width[i]/2, self.y[i] + self.height[i]/2)
+    
+    def right_center(self, i):
+        return Point(self.x[i] + self.width[i]/2, self.y[i] + self.height[i]/2)
+    
+    def rects(self):
+        """Прямоугольники блоков (left, top, right, bottom) в порядке номеров"""
+        for x, y, width, height in zip(self.x, self.y, self.width, self.height):
+            yield x - width/2, y, x + width/2, y + height
+    
+    # Доступ по строковому id, как к словарю блоков
+    def __len__(self):
+        return len(self.ids)
+    
+    def __iter__(self):
+        return iter(self.ids)
+    
+    def __contains__(self, block_id):
+        return block_id in self.index
+    
+    def __getitem__(self, block_id):
+        return Block(self, self.index[block_id])
+    
+    def keys(self):
+        return list(self.ids)
+    
+    def values(self):
+        return [Block(self, i) for i in range(len(self.ids))]
+    
+    def items(self):
+        return [(block_id, Block(self, i)) for i, block_id in enumerate(self.ids)]
+
 class Block:
-    block_id: str
-    block_type: str
-    label: str
-    condition: str = ""
-    next_true: str = ""
-    next_false: str = ""
-    
-    # Координаты и размеры
-    x: float = 0
-    y: float = 0
-    width: float = 0
-    height: float = 0
-    
-    # Точки подключения линий
-    top_center: Point = None
-    bottom_center: Point = None
-    left_center: Point = None
-    right_center: Point = None
+    """Блок хранилища BlockStore: своих данных не держит, читает столбцы по номеру"""
+    __slots__ = ("store", "index")
+    
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+    
+    block_id = property(lambda self: self.store.ids[self.index])
+    block_type = property(lambda self: self.store.block_type(self.index))
+    label = _column("labels")
+    condition = _column("conditions")
+    text = _column("texts")
+    x = _column("x")
+    y = _column("y")
+    width = _column("width")
+    height = _column("height")
+    layer = _column("layer")
+    
+    @property
+    def next_true(self):
+        target = self.store.next_true[self.index]
+        return self.store.ids[target] if target >= 0 else ""
+    
+    @property
+    def next_false(self):
+        target = self.store.next_false[self.index]
+        return self.store.ids[target] if target >= 0 else ""
+    
+    top_center = property(lambda self: self.store.top_center(self.index))
+    bottom_center = property(lambda self: self.store.bottom_center(self.index))
+    left_center = property(lambda self: self.store.left_center(self.index))
+    right_center = property(lambda self: self.store.right_center(self.index))
+    
+    def __eq__(self, other):
+        return isinstance(other, Block) and self.store is other.store and self.index == other.index
+    
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+    
+    def __repr__(self):
+        return f"Block({self.block_id!r}, {self.block_type!r}, x={self.x:.1f}, y={self.y:.1f})"
+
+class SpatialGrid:
+    """Равномерная сетка над прямоугольниками блоков: препятствия ищутся только в задетых ячейках"""
+    
+    def __init__(self, rects, cell_size):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)
+        self.rects = []
+        for i, rect in enumerate(rects):
+            self.rects.append(rect)
+            for cell in self._cells(*rect):
+                self.cells[cell].append((rect, i))
+
+    def move(self, i, rect):
+        """Переносит прямоугольник i на новое место, не перестраивая сетку"""
+        old = self.rects[i]
+        for cell in self._cells(*old):
+            self.cells[cell].remove((old, i))
+        self.rects[i] = rect
+        for cell in self._cells(*rect):
+            self.cells[cell].append((rect, i))
+
+    def _cells(self, left, top, right, bottom):
+        size = self.cell_size
+        for cx in range(int(left // size), int(right // size) + 1):
+            for cy in range(int(top // size), int(bottom // size) + 1):
+                yield cx, cy
+    
+    def query(self, left, top, right, bottom):
+        """Номера прямоугольников, пересекающихся с заданным"""
+        found = {}
+        for cell in self._cells(left, top, right, bottom):
+            for rect, i in self.cells.get(cell, ()):
+                if rect[0] <= right and left <= rect[2] and rect[1] <= bottom and top <= rect[3]:
+                    found[i] = rect
+        return list(found)
 
 class FlowchartRenderer:
     def __init__(self, json_data):
         self.data = json_data
-        self.blocks = {}
+        self.blocks = BlockStore()
         self.connections = []
+        self.routes = None
+        self.route_grid = None
+        # Крайние точки каждой линии, заводятся при первой правке
+        self.route_right = self.route_bottom = None
+        # Фрагменты SVG по id элементов и размер схемы: с ними сравнивается перерисованное после правки
+        self.fragments = None
+        self.svg_size = None
         
         # Параметры рисования
         self.block_width = 200
@@ -44,6 +349,10 @@ class FlowchartRenderer:
         self.vertical_spacing = 80
         self.margin = 50
         self.connector_radius = 5
+        self.lane_gap = 12
+        self.branch_exit = 20
+        self.font_family = "Arial"
+        self.font_size = 12
         
         # Текущая позиция
         self.current_x = 0
@@ -51,119 +360,546 @@ class FlowchartRenderer:
         
     def calculate_text_dimensions(self, text, max_width=180):
         """Рассчитывает размеры текста и разбивает на строки при необходимости"""
-        if not text:
-            return [], 80, 40
-            
-        words = text.split()
-        lines = []
-        current_line = []
-        
-        for word in words:
-            test_line = ' '.join(current_line + [word])
-            if len(test_line) * 8 <= max_width:
-                current_line.append(word)
-            else:
-                if current_line:
-                    lines.append(' '.join(current_line))
-                current_line = [word]
-        
-        if current_line:
-            lines.append(' '.join(current_line))
-            
-        height = len(lines) * 20 + 20
-        width = max(len(line) * 8 for line in lines) if lines else 80
-        width = min(width + 40, max_width)
-        
-        return lines, width, height
+        text_layout = layout_text(text, max_width, self.font_family, self.font_size)
+        return list(text_layout.lines), text_layout.width, text_layout.height
     
     def create_blocks(self):
         """Создает блоки на основе JSON данных"""
-        flowchart = self.data["flowchart"]
-        
-        for block_id, block_data in flowchart.items():
-            block_type = block_data["type"]
-            label = block_data.get("label", "")
-            condition = block_data.get("condition", "")
-            
-            block = Block(
-                block_id=block_id,
-                block_type=block_type,
-                label=label,
-                condition=condition
-            )
-            
-            # Устанавливаем связи
-            if "next" in block_data:
-                block.next_true = block_data["next"]
-            elif "true" in block_data and "false" in block_data:
-                block.next_true = block_data["true"]
-                block.next_false = block_data["false"]
-                
-            self.blocks[block_id] = block
+        self.blocks = BlockStore.from_flowchart(self.data["flowchart"])
     
     def calculate_positions(self):
-        """Рассчитывает позиции всех блоков"""
-        # Находим порядок блоков
-        order = self._get_blocks_order()
-        
-        for i, block_id in enumerate(order):
-            block = self.blocks[block_id]
-            text_lines, text_width, text_height = self.calculate_text_dimensions(block.label)
-            
-            if block.block_type == "decision":
-                block.width = self.diamond_width
-                block.height = self.diamond_height
-            else:
-                block.width = max(text_width, self.block_width)
-                block.height = max(text_height, self.block_height)
-            
-            block.x = self.margin + self.block_width / 2
-            block.y = self.margin + i * (self.block_height + self.vertical_spacing)
-            
-            # Рассчитываем точки подключения
-            block.top_center = Point(block.x, block.y)
-            block.bottom_center = Point(block.x, block.y + block.height)
-            block.left_center = Point(block.x - block.width/2, block.y + block.height/2)
-            block.right_center = Point(block.x + block.width/2, block.y + block.height/2)
+        """Рассчитывает позиции всех блоков послойной укладкой (Сугияма)"""
+        blocks = self.blocks
+        decision = blocks.code("decision")
+        for i in range(len(blocks)):
+            self._measure_block(i, decision)
+        self._arrange()
+
+    def _measure_block(self, i, decision):
+        """Текст и размеры блока; True, если размеры изменились"""
+        blocks = self.blocks
+        old_size = blocks.width[i], blocks.height[i]
+        # Ромб подписывается условием, остальные блоки - меткой
+        if blocks.types[i] == decision:
+            text = layout_text(blocks.conditions[i], 180, self.font_family, self.font_size)
+            blocks.width[i] = self.diamond_width
+            blocks.height[i] = self.diamond_height
+        else:
+            text = layout_text(blocks.labels[i], 180, self.font_family, self.font_size)
+            blocks.width[i] = max(text.width, self.block_width)
+            blocks.height[i] = max(text.height, self.block_height)
+        blocks.texts[i] = text
+        return (blocks.width[i], blocks.height[i]) != old_size
+
+    def _arrange(self):
+        """Слои, порядок в слоях и координаты по уже измеренным блокам"""
+        order, back_edges = self._get_blocks_order()
+        predecessors, successors = self._acyclic_edges(order, back_edges)
+        layers = self._assign_layers(order, predecessors)
+        self._order_layers(layers, predecessors, successors)
+        self.successors = successors
+        self._assign_coordinates(layers, predecessors)
+
+    def _successors(self, i):
+        """Следующие блоки: сначала ветка true, потом false"""
+        return [target for target in (self.blocks.next_true[i], self.blocks.next_false[i]) if target >= 0]
     
     def _get_blocks_order(self):
-        """Возвращает порядок блоков в правильной последовательности"""
+        """Обход в глубину от start: порядок блоков и обратные дуги циклов"""
         order = []
-        current = "start"
-        visited = set()
-        
-        while current and current not in visited:
-            visited.add(current)
-            order.append(current)
-            
-            block = self.blocks[current]
-            if block.next_true and block.next_true not in visited:
-                current = block.next_true
+        back_edges = set()
+        state = bytearray(len(self.blocks))  # 1 - блок на стеке обхода, 2 - обработан
+        
+        start = self.blocks.index.get("start")
+        roots = [start] if start is not None else []
+        roots += [i for i in range(len(self.blocks)) if i != start]
+        for root in roots:
+            if state[root]:
+                continue
+            state[root] = 1
+            order.append(root)
+            stack = [(root, iter(self._successors(root)))]
+            while stack:
+                block, targets = stack[-1]
+                for target in targets:
+                    if not state[target]:
+                        state[target] = 1
+                        order.append(target)
+                        stack.append((target, iter(self._successors(target))))
+                        break
+                    if state[target] == 1:
+                        back_edges.add((block, target))
+                else:
+                    state[block] = 2
+                    stack.pop()
+        
+        return order, back_edges
+    
+    def _acyclic_edges(self, order, back_edges):
+        """Дуги без обратных дуг циклов"""
+        predecessors = [[] for _ in range(len(self.blocks))]
+        successors = [[] for _ in range(len(self.blocks))]
+        for block in order:
+            for target in self._successors(block):
+                if (block, target) not in back_edges and target not in successors[block]:
+                    successors[block].append(target)
+                    predecessors[target].append(block)
+        return predecessors, successors
+    
+    def _assign_layers(self, order, predecessors):
+        """Слой блока - длина самого длинного пути до него"""
+        layer_of = self.blocks.layer
+        pending = [len(sources) for sources in predecessors]
+        successors = [[] for _ in predecessors]
+        for block in order:
+            for source in predecessors[block]:
+                successors[source].append(block)
+        
+        # Топологический порядок, блоки без входов берутся в порядке обхода
+        ready = [block for block in reversed(order) if not pending[block]]
+        while ready:
+            block = ready.pop()
+            layer_of[block] = max((layer_of[source] + 1 for source in predecessors[block]), default=0)
+            for target in reversed(successors[block]):
+                pending[target] -= 1
+                if not pending[target]:
+                    ready.append(target)
+        
+        layers = [[] for _ in range(max(layer_of, default=-1) + 1)]
+        for block in order:
+            layers[layer_of[block]].append(block)
+        return layers
+    
+    def _order_layers(self, layers, predecessors, successors, sweeps=4):
+        """Уменьшает пересечения линий: упорядочивает слои по барицентрам соседей"""
+        position = [0] * len(self.blocks)
+        for layer in layers:
+            for i, block in enumerate(layer):
+                position[block] = i
+        
+        for sweep in range(sweeps):
+            downward = sweep % 2 == 0
+            neighbours = predecessors if downward else successors
+            for layer in (layers[1:] if downward else reversed(layers[:-1])):
+                keys = {}
+                for block in layer:
+                    linked = neighbours[block]
+                    keys[block] = sum(position[other] for other in linked) / len(linked) if linked else position[block]
+                layer.sort(key=keys.__getitem__)
+                for i, block in enumerate(layer):
+                    position[block] = i
+    
+    def _assign_coordinates(self, layers, predecessors):
+        """Координаты: блок тянется к среднему предков, не нарушая порядок и отступы в слое"""
+        self.layers = layers
+        self.predecessors = predecessors
+        # Иксы до сдвига к полю хранятся отдельно: по ним досчитываются слои после правки
+        self.raw_x = array("d", bytes(8 * len(self.blocks)))
+        for layer in layers:
+            self._place_layer(layer)
+        self.channel_tracks = self._count_tracks()
+        self.layer_y = []
+        self.layer_heights = []
+        self._place_rows(0)
+        self.shift = None
+        self._shift_to_margin()
+
+    def _place_layer(self, layer):
+        """Иксы блоков слоя до сдвига к полю; номера блоков, чей икс изменился"""
+        raw, widths, predecessors = self.raw_x, self.blocks.width, self.predecessors
+        desired = []
+        for i, block in enumerate(layer):
+            linked = predecessors[block]
+            if linked:
+                desired.append(sum(raw[other] for other in linked) / len(linked))
+            else:
+                desired.append(i * (self.block_width + self.horizontal_spacing))
+
+        gaps = [
+            (widths[left] + widths[right]) / 2 + self.horizontal_spacing
+            for left, right in zip(layer, layer[1:])
+        ]
+        # Два прохода (слева направо и справа налево) с их средним - без перекоса в одну сторону
+        pushed_right = desired[:]
+        for i in range(1, len(layer)):
+            pushed_right[i] = max(pushed_right[i], pushed_right[i - 1] + gaps[i - 1])
+        pushed_left = desired[:]
+        for i in range(len(layer) - 2, -1, -1):
+            pushed_left[i] = min(pushed_left[i], pushed_left[i + 1] - gaps[i])
+
+        moved = []
+        for i, block in enumerate(layer):
+            x = (pushed_right[i] + pushed_left[i]) / 2
+            if raw[block] != x:
+                raw[block] = x
+                moved.append(block)
+        return moved
+
+    def _place_rows(self, first):
+        """Ординаты слоёв начиная с first; номера блоков, чья ордината изменилась"""
+        ys, heights = self.blocks.y, self.blocks.height
+        spread = self._channel_spread
+        del self.layer_y[first:], self.layer_heights[first:]
+        if first:
+            y = self.layer_y[-1] + (self.layer_heights[-1] + self.vertical_spacing + spread(first))
+        else:
+            y = self.margin + spread(0)
+        moved = []
+        for index, layer in enumerate(self.layers[first:], first):
+            height = 0
+            for block in layer:
+                if ys[block] != y:
+                    ys[block] = y
+                    moved.append(block)
+                height = max(height, heights[block])
+            self.layer_y.append(y)
+            self.layer_heights.append(height)
+            y += height + self.vertical_spacing + spread(index + 1)
+        return moved
+    
+    def _edge_channels(self, from_block, to_block):
+        """Каналы горизонтальных участков линии: под слоем начала и над слоем конца.
+        Канал i идёт над слоем i, последний - под нижним слоем"""
+        layer_of = self.blocks.layer
+        return layer_of[from_block] + 1, layer_of[to_block]
+    
+    def _count_tracks(self):
+        """Число линий в каждом канале; считается по связям, так что правка меток его не меняет"""
+        counts = [0] * (len(self.layers) + 1)
+        for from_block, to_block, _ in self._edges():
+            below, above = self._edge_channels(from_block, to_block)
+            counts[below] += 1
+            if above != below:
+                counts[above] += 1
+        return counts
+    
+    def _channel_spread(self, index):
+        """На сколько канал index шире обычного промежутка: по lane_gap на каждую дорожку сверх первой"""
+        return max(self.channel_tracks[index] - 1, 0) * self.lane_gap
+
+    def _shift_to_margin(self, moved=()):
+        """Сдвигает схему к левому полю; если сдвиг прежний, пересчитываются только иксы блоков moved.
+        Возвращает True, если сдвинулись все блоки"""
+        xs, raw = self.blocks.x, self.raw_x
+        if not len(self.blocks):
+            return False
+        shift = self.margin - min(x - width / 2 for x, width in zip(raw, self.blocks.width))
+        if shift == self.shift:
+            for i in moved:
+                xs[i] = raw[i] + shift
+            return False
+        self.shift = shift
+        for i in range(len(xs)):
+            xs[i] = raw[i] + shift
+        return True
+
+    def layout(self):
+        """Расставляет блоки и прокладывает линии, после этого блок-схему можно выводить"""
+        with tracing.span("layout"):
+            with tracing.span("create_blocks"):
+                self.create_blocks()
+            with tracing.span("calculate_positions", blocks=len(self.blocks)):
+                self.calculate_positions()
+            with tracing.span("route_connections"):
+                self.routes = self._route_connections()
+        self.route_grid = None
+        self.route_right = self.route_bottom = None
+        self.fragments = None
+    
+    def update(self, flowchart):
+        """Переводит уложенную схему к новому словарю блоков; возвращает патч, как apply_changes"""
+        old = self.data["flowchart"]
+        removed = [block_id for block_id in old if block_id not in flowchart]
+        changed = {block_id: block_data for block_id, block_data in flowchart.items() if old.get(block_id) != block_data}
+        # Порядок блоков влияет на укладку; правка на месте оставляет прежние блоки по порядку и добавляет новые в конец
+        kept = [block_id for block_id in old if block_id in flowchart]
+        if kept + [block_id for block_id in flowchart if block_id not in old] != list(flowchart):
+            return self._relayout_all(dict(self.data, flowchart=flowchart))
+        return self.apply_changes(changed, removed)
+    
+    def apply_changes(self, changed=None, removed=()):
+        """Правит схему на месте: changed - новые и изменённые блоки {id: данные}, removed - id удалённых блоков.
+        Связи входят в данные блока, так что новая связь - это изменённый блок. Перекладываются только задетые
+        слои и линии, результат тот же, что у полной укладки новой схемы. Возвращает патч для страницы с SVG из
+        iter_svg(ids=True): список операций {"op": "add" или "replace", "id", "parent", "svg"},
+        {"op": "remove", "id"} и {"op": "size", "width", "height"}"""
+        changed = changed or {}
+        removed = {block_id for block_id in removed if block_id in self.data["flowchart"]}
+        if self.routes is None:
+            self.layout()
+        if self.fragments is None:
+            self._remember_fragments()
+        
+        old_flowchart = self.data["flowchart"]
+        flowchart = {block_id: block_data for block_id, block_data in old_flowchart.items() if block_id not in removed}
+        flowchart.update(changed)
+        self.data = dict(self.data, flowchart=flowchart)
+        
+        # Без новых и удалённых блоков и связей слои и порядок в них прежние
+        relinked = bool(removed) or any(
+            block_id not in old_flowchart or _link_targets(old_flowchart[block_id]) != _link_targets(block_data)
+            for block_id, block_data in changed.items()
+        )
+        with tracing.span("apply_changes", changed=len(changed), removed=len(removed), relinked=relinked):
+            if relinked:
+                redrawn, rerouted, gone = self._relayout_structure(changed)
             else:
-                break
-                
-        # Добавляем оставшиеся блокы
-        for block_id in self.blocks:
-            if block_id not in visited:
-                order.append(block_id)
-                
-        return order
+                redrawn, rerouted, gone = self._relayout_blocks(changed)
+            self.route_grid = None
+            updated = [("edges",) + self._edge_element(k) for k in sorted(rerouted)]
+            updated += [("blocks",) + self._block_element(i) for i in sorted(redrawn)]
+            return self._patch(updated, gone)
+    
+    def _relayout_blocks(self, changed):
+        """Правка меток и типов при прежних связях: перемеряются изменённые блоки, перекладываются их слои
+        и те слои ниже, куда дошёл сдвиг"""
+        blocks = self.blocks
+        retyped = set()
+        for block_id, block_data in changed.items():
+            i = blocks.index[block_id]
+            blocks.types[i] = blocks.code(block_data["type"], create=True)
+            blocks.labels[i] = block_data.get("label", "")
+            blocks.conditions[i] = block_data.get("condition", "")
+            retyped.add(i)
+        decision = blocks.code("decision")
+        resized = [i for i in retyped if self._measure_block(i, decision)]
+        
+        # Ширина блока меняет промежутки в его слое, высота - высоту слоя и ординаты всех слоёв ниже
+        moved = self._replace_layers({blocks.layer[i] for i in resized})
+        moved.update(resized)
+        if len(moved) * 2 > len(blocks):
+            self.grid = SpatialGrid(blocks.rects(), self.grid.cell_size)
+        else:
+            for i in moved:
+                self.grid.move(i, self._rect(i))
+        dirty_layers = sorted({blocks.layer[i] for i in moved})
+        for index in dirty_layers:
+            self.extents[index] = self._layer_extent(self.layers[index])
+        self._build_channels()
+        
+        lanes, tracks = self.back_lanes, self.tracks
+        self.back_lanes = self._assign_back_lanes(self.edges)
+        self.tracks = self._assign_tracks(self.edges)
+        rerouted = []
+        for k, (from_block, to_block, is_true_branch) in enumerate(self.edges):
+            if (from_block in moved or to_block in moved or from_block in retyped
+                    or self.back_lanes.get(to_block) != lanes.get(to_block) or self.tracks[k] != tracks[k]
+                    or self._crosses(from_block, to_block, dirty_layers)):
+                self.routes[k] = self._connection_points(k)
+                rerouted.append(k)
+        self._route_bounds(rerouted)
+        return moved | retyped, rerouted, []
+    
+    def _relayout_structure(self, changed):
+        """Правка с новыми, удалёнными блоками или связями: слои строятся заново по уже измеренным блокам,
+        линии перекладываются только там, где сдвинулись блоки или сменился состав слоёв"""
+        old_blocks, old_layers, old_edges, old_routes, old_tracks = self.blocks, self.layers, self.edges, self.routes, self.tracks
+        old_lanes = {old_blocks.ids[target]: lane for target, lane in self.back_lanes.items()}
+        blocks = self.blocks = BlockStore.from_flowchart(self.data["flowchart"])
+        decision = blocks.code("decision")
+        retyped = set()
+        for i, block_id in enumerate(blocks.ids):
+            j = old_blocks.index.get(block_id)
+            if j is None or block_id in changed:
+                self._measure_block(i, decision)
+                retyped.add(i)
+            else:
+                blocks.texts[i] = old_blocks.texts[j]
+                blocks.width[i] = old_blocks.width[j]
+                blocks.height[i] = old_blocks.height[j]
+        self._arrange()
+        
+        moved = set(retyped)
+        for i, block_id in enumerate(blocks.ids):
+            j = old_blocks.index.get(block_id)
+            if j is not None and (blocks.x[i], blocks.y[i], blocks.width[i], blocks.height[i]) != (
+                    old_blocks.x[j], old_blocks.y[j], old_blocks.width[j], old_blocks.height[j]):
+                moved.add(i)
+        # Слой с другим составом (и слой, которого раньше не было или больше нет) задевает линии своими каналами
+        dirty_layers = {blocks.layer[i] for i in moved}
+        for index, layer in enumerate(self.layers):
+            if index >= len(old_layers) or [blocks.ids[i] for i in layer] != [old_blocks.ids[j] for j in old_layers[index]]:
+                dirty_layers.add(index)
+        dirty_layers = sorted(dirty_layers.union(range(len(self.layers), len(old_layers))))
+        
+        self.routes_right = self.routes_bottom = 0
+        self.edges = []
+        self.routes = []
+        if len(blocks):
+            self._prepare_routing()
+            self.edges = list(self._edges())
+        self.back_lanes = self._assign_back_lanes(self.edges)
+        self.tracks = self._assign_tracks(self.edges)
+        previous = {
+            (old_blocks.ids[from_block], is_true_branch): (old_blocks.ids[to_block], points, track)
+            for (from_block, to_block, is_true_branch), points, track in zip(old_edges, old_routes, old_tracks)
+        }
+        rerouted = []
+        for k, (from_block, to_block, is_true_branch) in enumerate(self.edges):
+            target_id, points, track = previous.pop((blocks.ids[from_block], is_true_branch), (None, None, None))
+            if (target_id != blocks.ids[to_block] or from_block in moved or to_block in moved
+                    or self.back_lanes.get(to_block) != old_lanes.get(target_id) or self.tracks[k] != track
+                    or self._crosses(from_block, to_block, dirty_layers)):
+                points = self._connection_points(k)
+                rerouted.append(k)
+            self.routes.append(points)
+        self._route_bounds()
+        
+        gone = [_block_element_id(block_id) for block_id in old_blocks.ids if block_id not in blocks.index]
+        gone += [_edge_element_id(block_id, is_true_branch) for block_id, is_true_branch in previous]
+        return moved, rerouted, gone
+    
+    def _replace_layers(self, dirty):
+        """Перекладывает слои dirty и слои ниже, куда дошёл сдвиг предков; номера блоков, сменивших координаты"""
+        layer_of, heights = self.blocks.layer, self.blocks.height
+        moved = set()
+        first_row = None
+        pending = list(dirty)
+        heapq.heapify(pending)
+        done = set()
+        # Предки блока лежат в слоях выше, так что слои перекладываются сверху вниз
+        while pending:
+            index = heapq.heappop(pending)
+            if index in done:
+                continue
+            done.add(index)
+            layer = self.layers[index]
+            for block in self._place_layer(layer):
+                moved.add(block)
+                for target in self.successors[block]:
+                    heapq.heappush(pending, layer_of[target])
+            if max(heights[block] for block in layer) != self.layer_heights[index] and (first_row is None or index < first_row):
+                first_row = index
+        if first_row is not None:
+            moved.update(self._place_rows(first_row))
+        if self._shift_to_margin(moved):
+            moved.update(range(len(self.blocks)))
+        return moved
+    
+    def _crosses(self, from_block, to_block, layers):
+        """Задевает ли линия слои из упорядоченного списка layers: свои, промежуточные и соседние, чьи каналы она занимает"""
+        layer_of = self.blocks.layer
+        low, high = sorted((layer_of[from_block], layer_of[to_block]))
+        position = bisect_left(layers, low - 1)
+        return position < len(layers) and layers[position] <= high + 1
+    
+    def _rect(self, i):
+        blocks = self.blocks
+        return blocks.x[i] - blocks.width[i]/2, blocks.y[i], blocks.x[i] + blocks.width[i]/2, blocks.y[i] + blocks.height[i]
+    
+    def _route_bounds(self, rerouted=None):
+        """Правый и нижний края линий; крайние точки каждой линии хранятся, так что после правки пересчитываются только линии rerouted"""
+        if rerouted is None or self.route_right is None:
+            self.route_right = array('d', (max(x for x, _ in points) for points in self.routes))
+            self.route_bottom = array('d', (max(y for _, y in points) for points in self.routes))
+        else:
+            for k in rerouted:
+                points = self.routes[k]
+                self.route_right[k] = max(x for x, _ in points)
+                self.route_bottom[k] = max(y for _, y in points)
+        self.routes_right = max(self.route_right, default=0)
+        self.routes_bottom = max(self.route_bottom, default=0)
+    
+    def _relayout_all(self, data):
+        """Полная укладка новой схемы; патч - разница всех фрагментов со старыми"""
+        if self.routes is None:
+            self.layout()
+        if self.fragments is None:
+            self._remember_fragments()
+        old_fragments, old_size = self.fragments, self.svg_size
+        self.data = data
+        self.layout()
+        self._remember_fragments()
+        fragments, self.fragments, self.svg_size = self.fragments, old_fragments, old_size
+        updated = [("edges" if element_id.startswith("edge-") else "blocks", element_id, fragment) for element_id, fragment in fragments.items()]
+        return self._patch(updated, [element_id for element_id in old_fragments if element_id not in fragments])
+    
+    def _remember_fragments(self):
+        self.fragments = {}
+        for _ in self._iter_elements(range(len(self.blocks)), range(len(self.routes)), True):
+            pass
+        self.svg_size = tuple(int(value) for value in self.size()) if len(self.blocks) else (0, 0)
+    
+    def _patch(self, updated, gone):
+        """Операции патча: удаление пропавших элементов, замена изменившихся, добавление новых, новый размер"""
+        patch = []
+        for element_id in gone:
+            if self.fragments.pop(element_id, None) is not None:
+                patch.append({"op": "remove", "id": element_id})
+        for parent, element_id, fragment in updated:
+            old = self.fragments.get(element_id)
+            if old == fragment:
+                continue
+            self.fragments[element_id] = fragment
+            patch.append({"op": "replace" if old is not None else "add", "id": element_id, "parent": parent, "svg": fragment})
+        size = tuple(int(value) for value in self.size()) if len(self.blocks) else (0, 0)
+        if size != self.svg_size:
+            self.svg_size = size
+            patch.append({"op": "size", "width": size[0], "height": size[1]})
+        return patch
     
     def generate_svg(self):
         """Генерирует SVG код блок-схемы"""
-        self.create_blocks()
-        self.calculate_positions()
+        with tracing.span("generate_svg"):
+            return ''.join(self.iter_svg())
+    
+    def render_to(self, fp, html=False, relayout=True, **options):
+        """Пишет SVG (или HTML-страницу с ним) в файл или сокет по частям, не собирая строку целиком"""
+        write = fp.write
+        with tracing.span("render_to", html=html):
+            for fragment in (self.iter_html(relayout=relayout) if html else self.iter_svg(relayout=relayout, **options)):
+                write(fragment)
+    
+    def size(self):
+        """Общие размеры блок-схемы (вместе с боковыми каналами циклов)"""
+        blocks = self.blocks
+        max_y = max(y + height for y, height in zip(blocks.y, blocks.height)) + self.margin
+        max_x = max(x + width/2 for x, width in zip(blocks.x, blocks.width)) + self.margin * 2
+        max_y = max(max_y, self.routes_bottom + self.margin)
+        max_x = max(max_x, self.routes_right + self.margin)
+        return max_x, max_y
+    
+    def visible(self, left, top, right, bottom):
+        """Номера блоков и линий, задевающих прямоугольник области"""
+        if self.route_grid is None:
+            boxes = []
+            for points in self.routes:
+                xs = [x for x, _ in points]
+                ys = [y for _, y in points]
+                boxes.append((min(xs), min(ys), max(xs), max(ys)))
+            self.route_grid = SpatialGrid(boxes, max(self.block_width, self.block_height) * 2)
+        if not len(self.blocks):
+            return [], []
+        return sorted(self.grid.query(left, top, right, bottom)), sorted(self.route_grid.query(left, top, right, bottom))
+    
+    def iter_svg(self, relayout=True, viewport=None, scale=1, ids=False):
+        """Отдаёт SVG код блок-схемы по фрагментам; viewport=(left, top, right, bottom) - только эта область в масштабе scale.
+        С ids=True линии и блоки обёрнуты в <g> с id, чтобы правки доходили до страницы патчами (см. apply_changes)"""
+        if relayout or self.routes is None:
+            self.layout()
         
-        # Рассчитываем общие размеры
-        max_y = max(block.y + block.height for block in self.blocks.values()) + self.margin
-        max_x = max(block.x + block.width/2 for block in self.blocks.values()) + self.margin * 2
+        if viewport is None:
+            max_x, max_y = self.size()
+            blocks, routes = range(len(self.blocks)), range(len(self.routes))
+            header = f'<svg width="{int(max_x)}" height="{int(max_y)}"'
+            if ids:
+                header = f'<svg id="flowchart" width="{int(max_x)}" height="{int(max_y)}"'
+                self.fragments = {}
+                self.svg_size = (int(max_x), int(max_y))
+        else:
+            left, top, right, bottom = viewport
+            blocks, routes = self.visible(left, top, right, bottom)
+            header = (
+                f'<svg width="{int((right - left) * scale)}" height="{int((bottom - top) * scale)}" '
+                f'viewBox="{left:.1f} {top:.1f} {right - left:.1f} {bottom - top:.1f}"'
+            )
         
-        svg = f'''<svg width="{int(max_x)}" height="{int(max_y)}" xmlns="http://www.w3.org/2000/svg">
+        yield f'''{header} xmlns="http://www.w3.org/2000/svg">
 <style>
     .block {{ fill: white; stroke: black; stroke-width: 2; }}
     .decision {{ fill: #e6f3ff; stroke: #0066cc; }}
     .startend {{ fill: #f0f0f0; stroke: #333; }}
-    .text {{ font-family: Arial, sans-serif; font-size: 12px; fill: #333; }}
+    .text {{ font-family: {self.font_family}, sans-serif; font-size: {self.font_size}px; fill: #333; }}
     .line {{ stroke: black; stroke-width: 2; fill: none; }}
 </style>
 <defs>
@@ -173,118 +909,312 @@ class FlowchartRenderer:
 </defs>
 '''
         
+        tracing.count("blocks drawn", len(blocks))
+        tracing.count("edges drawn", len(routes))
+        
+        if ids:
+            yield from self._iter_elements(blocks, routes, viewport is None)
+            yield '</svg>'
+            return
+        
         # Рисуем линии соединений
-        svg += self._draw_connections()
+        for i in routes:
+            yield self._draw_connection(self.routes[i])
         
         # Рисуем блоки
-        for block in self.blocks.values():
-            svg += self._draw_block(block)
+        for i in blocks:
+            yield from self._draw_block(i)
         
-        svg += '</svg>'
-        return svg
+        yield '</svg>'
+
+    def _iter_elements(self, blocks, routes, remember):
+        """Линии и блоки, каждый в своей группе с id; remember - запомнить фрагменты для патчей"""
+        yield '<g id="edges">\n'
+        for i in routes:
+            element_id, fragment = self._edge_element(i)
+            if remember:
+                self.fragments[element_id] = fragment
+            yield fragment
+        yield '</g>\n<g id="blocks">\n'
+        for i in blocks:
+            element_id, fragment = self._block_element(i)
+            if remember:
+                self.fragments[element_id] = fragment
+            yield fragment
+        yield '</g>\n'
+
+    def _block_element(self, i):
+        element_id = _block_element_id(self.blocks.ids[i])
+        return element_id, f'<g id="{element_id}">\n{"".join(self._draw_block(i))}</g>\n'
+
+    def _edge_element(self, k):
+        from_block, _, is_true_branch = self.edges[k]
+        element_id = _edge_element_id(self.blocks.ids[from_block], is_true_branch)
+        return element_id, f'<g id="{element_id}">\n{self._draw_connection(self.routes[k])}</g>\n'
+    
+    def iter_html(self, title=None, relayout=True, live=False):
+        """Отдаёт HTML-страницу для просмотра блок-схемы, SVG внутри идёт теми же фрагментами.
+        С live=True у элементов SVG есть id, а на странице - функция applyFlowchartPatch для патчей apply_changes"""
+        if title is None:
+            title = self.data.get('function', {}).get('name', '')
+        title = title.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+        yield f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Блок-схема {title}</title>
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        .container {{ text-align: center; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Блок-схема функции {title}</h1>
+        '''
+        yield from self.iter_svg(relayout=relayout, ids=live)
+        if live:
+            yield PATCH_SCRIPT
+        yield '''
+    </div>
+</body>
+</html>
+'''
     
-    def _draw_block(self, block):
+    def _draw_block(self, i):
         """Рисует отдельный блок"""
-        if block.block_type == "start" or block.block_type == "end":
-            return self._draw_ellipse(block)
-        elif block.block_type == "decision":
-            return self._draw_diamond(block)
+        block_type = self.blocks.block_type(i)
+        if block_type == "start" or block_type == "end":
+            return self._draw_ellipse(i)
+        elif block_type == "decision":
+            return self._draw_diamond(i)
         else:
-            return self._draw_rectangle(block)
+            return self._draw_rectangle(i)
     
-    def _draw_rectangle(self, block):
-        """Рисует прямоугольный блок"""
-        x = block.x - block.width/2
-        y = block.y
-        text_lines, _, _ = self.calculate_text_dimensions(block.label)
-        
-        svg = f'<rect x="{x:.1f}" y="{y:.1f}" width="{block.width:.1f}" height="{block.height:.1f}" class="block"/>\n'
-        
-        # Текст
-        text_y = y + 20
+    def _draw_text(self, x, text_y, text_lines):
+        """Строки текста блока, по одному элементу <text> на строку"""
         for i, line in enumerate(text_lines):
             # Экранируем специальные символы XML
             line_escaped = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            svg += f'<text x="{block.x:.1f}" y="{text_y + i*15:.1f}" text-anchor="middle" class="text">{line_escaped}</text>\n'
+            yield f'<text x="{x:.1f}" y="{text_y + i*15:.1f}" text-anchor="middle" class="text">{line_escaped}</text>\n'
+    
+    def _draw_rectangle(self, i):
+        """Рисует прямоугольный блок"""
+        blocks = self.blocks
+        width, height = blocks.width[i], blocks.height[i]
+        x = blocks.x[i] - width/2
+        y = blocks.y[i]
+        
+        yield f'<rect x="{x:.1f}" y="{y:.1f}" width="{width:.1f}" height="{height:.1f}" class="block"/>\n'
         
-        return svg
+        # Текст
+        yield from self._draw_text(blocks.x[i], y + 20, blocks.texts[i].lines)
     
-    def _draw_ellipse(self, block):
+    def _draw_ellipse(self, i):
         """Рисует эллиптический блок (начало/конец)"""
-        rx = block.width / 2
-        ry = block.height / 3
-        svg = f'<ellipse cx="{block.x:.1f}" cy="{block.y + ry:.1f}" rx="{rx:.1f}" ry="{ry:.1f}" class="block startend"/>\n'
+        blocks = self.blocks
+        x, y = blocks.x[i], blocks.y[i]
+        rx = blocks.width[i] / 2
+        ry = blocks.height[i] / 3
+        yield f'<ellipse cx="{x:.1f}" cy="{y + ry:.1f}" rx="{rx:.1f}" ry="{ry:.1f}" class="block startend"/>\n'
         
         # Текст
-        text_lines, _, _ = self.calculate_text_dimensions(block.label)
-        text_y = block.y + ry
-        for i, line in enumerate(text_lines):
-            line_escaped = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            svg += f'<text x="{block.x:.1f}" y="{text_y + i*15:.1f}" text-anchor="middle" class="text">{line_escaped}</text>\n'
-        
-        return svg
+        yield from self._draw_text(x, y + ry, blocks.texts[i].lines)
     
-    def _draw_diamond(self, block):
+    def _draw_diamond(self, i):
         """Рисует ромб (условие)"""
+        blocks = self.blocks
+        x, y, width, height = blocks.x[i], blocks.y[i], blocks.width[i], blocks.height[i]
         points = [
-            f"{block.x:.1f},{block.y:.1f}",
-            f"{block.x + block.width/2:.1f},{block.y + block.height/2:.1f}",
-            f"{block.x:.1f},{block.y + block.height:.1f}",
-            f"{block.x - block.width/2:.1f},{block.y + block.height/2:.1f}"
+            f"{x:.1f},{y:.1f}",
+            f"{x + width/2:.1f},{y + height/2:.1f}",
+            f"{x:.1f},{y + height:.1f}",
+            f"{x - width/2:.1f},{y + height/2:.1f}"
         ]
         points_str = " ".join(points)
-        svg = f'<polygon points="{points_str}" class="block decision"/>\n'
+        yield f'<polygon points="{points_str}" class="block decision"/>\n'
         
         # Текст условия
-        if block.condition:
-            text_lines, _, _ = self.calculate_text_dimensions(block.condition)
-            text_y = block.y + block.height/2 - (len(text_lines)-1)*7.5
-            for i, line in enumerate(text_lines):
-                line_escaped = line.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-                svg += f'<text x="{block.x:.1f}" y="{text_y + i*15:.1f}" text-anchor="middle" class="text">{line_escaped}</text>\n'
-        
-        return svg
-    
-    def _draw_connections(self):
-        """Рисует линии соединений между блоками"""
-        svg = ""
-        
-        for block in self.blocks.values():
-            if block.next_true:
-                next_block = self.blocks.get(block.next_true)
-                if next_block:
-                    svg += self._draw_connection(block, next_block, True)
-            
-            if block.next_false:
-                next_block = self.blocks.get(block.next_false)
-                if next_block:
-                    svg += self._draw_connection(block, next_block, False)
-        
-        return svg
-    
-    def _draw_connection(self, from_block, to_block, is_true_branch):
-        """Рисует линию соединения между двумя блоками"""
-        if from_block.block_type == "decision":
-            if is_true_branch:
-                # Из нижней точки ромба
-                start_x, start_y = from_block.bottom_center.x, from_block.bottom_center.y
-            else:
-                # Из правой точки ромба
-                start_x, start_y = from_block.right_center.x, from_block.right_center.y
+        if blocks.conditions[i]:
+            text_lines = blocks.texts[i].lines
+            yield from self._draw_text(x, y + height/2 - (len(text_lines)-1)*7.5, text_lines)
+    
+    def _prepare_routing(self):
+        """Каналы между слоями, сетка препятствий и правые границы слоёв для обходов циклов"""
+        self.grid = SpatialGrid(self.blocks.rects(), max(self.block_width, self.block_height) * 2)
+        self.extents = [self._layer_extent(layer) for layer in self.layers]
+        self._build_channels()
+
+    def _layer_extent(self, layer):
+        """Верх, низ и правый край слоя"""
+        xs, ys, widths, heights = self.blocks.x, self.blocks.y, self.blocks.width, self.blocks.height
+        return (
+            min(ys[i] for i in layer),
+            max(ys[i] + heights[i] for i in layer),
+            max(xs[i] + widths[i]/2 for i in layer),
+        )
+
+    def _build_channels(self):
+        """Каналы между слоями и таблица правых границ по границам слоёв"""
+        tops = [top for top, _, _ in self.extents]
+        bottoms = [bottom for _, bottom, _ in self.extents]
+        rights = [right for _, _, right in self.extents]
+        # Середины промежутков между слоями, там блоков нет; дорожки линий расходятся от середины
+        if tops:
+            self.channels = [tops[0] - self.vertical_spacing / 2 - self._channel_spread(0) / 2]
+            self.channels += [(bottom + top) / 2 for bottom, top in zip(bottoms, tops[1:])]
+            self.channels.append(bottoms[-1] + self.vertical_spacing / 2 + self._channel_spread(len(bottoms)) / 2)
         else:
-            # Из нижней точки прямоугольника
-            start_x, start_y = from_block.bottom_center.x, from_block.bottom_center.y
+            self.channels = [0]
+        
+        # Разреженная таблица максимумов: правая граница любого диапазона слоёв за O(1)
+        self.right_table = [rights]
+        width = 1
+        while width * 2 <= len(rights):
+            previous = self.right_table[-1]
+            self.right_table.append([max(previous[i], previous[i + width]) for i in range(len(previous) - width)])
+            width *= 2
+    
+    def _rightmost(self, first_layer, last_layer):
+        level = (last_layer - first_layer + 1).bit_length() - 1
+        row = self.right_table[level]
+        return max(row[first_layer], row[last_layer - (1 << level) + 1])
+    
+    def _edges(self):
+        next_true, next_false = self.blocks.next_true, self.blocks.next_false
+        for i in range(len(self.blocks)):
+            if next_true[i] >= 0:
+                yield i, next_true[i], True
+            if next_false[i] >= 0:
+                yield i, next_false[i], False
+    
+    def _assign_back_lanes(self, edges):
+        """Обратные дуги в один блок идут одной полосой, пересекающиеся по слоям полосы раздвигаются"""
+        layer = self.blocks.layer
+        spans = {}
+        for from_block, to_block, _ in edges:
+            if layer[to_block] <= layer[from_block]:
+                first, last = spans.get(to_block, (layer[to_block], layer[from_block]))
+                spans[to_block] = (min(first, layer[to_block]), max(last, layer[from_block]))
+        
+        lanes = {}
+        active = []
+        free = []
+        used = 0
+        for target, (first, last) in sorted(spans.items(), key=lambda item: item[1]):
+            while active and active[0][0] < first:
+                heapq.heappush(free, heapq.heappop(active)[1])
+            if free:
+                index = heapq.heappop(free)
+            else:
+                index = used
+                used += 1
+            heapq.heappush(active, (last, index))
+            lanes[target] = self._rightmost(first, last) + self.horizontal_spacing / 2 + index * self.lane_gap
+        return lanes
+    
+    def _assign_tracks(self, edges):
+        """Своя дорожка каждой линии в каждом её канале, чтобы горизонтальные участки разных линий не сливались.
+        Дорожки идут сверху вниз по иксу, где линия входит в канал; на линию - смещения от середины канала
+        под слоем начала и над слоем конца"""
+        blocks = self.blocks
+        decision = blocks.code("decision")
+        runs = defaultdict(list)
+        for k, (from_block, to_block, is_true_branch) in enumerate(edges):
+            if not is_true_branch and blocks.types[from_block] == decision:
+                start = blocks.x[from_block] + blocks.width[from_block] / 2 + self.branch_exit
+            else:
+                start = blocks.x[from_block]
+            end = blocks.x[to_block]
+            below, above = self._edge_channels(from_block, to_block)
+            # Линия в соседний слой проходит свой единственный канал одним участком
+            runs[below].append((start, end, k, (0, 1) if above == below else (0,)))
+            if above != below:
+                runs[above].append((end, end, k, (1,)))
         
-        # В верхнюю точку следующего блока
-        end_x, end_y = to_block.top_center.x, to_block.top_center.y
+        tracks = [[0.0, 0.0] for _ in edges]
+        for channel_runs in runs.values():
+            middle = (len(channel_runs) - 1) / 2
+            for track, (_, _, k, sides) in enumerate(sorted(channel_runs)):
+                for side in sides:
+                    tracks[k][side] = (track - middle) * self.lane_gap
+        return [tuple(offsets) for offsets in tracks]
+    
+    def _free_lane(self, x, top, bottom, first_layer, last_layer):
+        """Вертикаль от top до bottom, не задевающая блоков: сдвигается вправо за мешающие блоки"""
+        for _ in range(8):
+            hits = self.grid.query(x, top, x, bottom)
+            if not hits:
+                return x
+            x = max(self.blocks.x[i] + self.blocks.width[i]/2 for i in hits) + self.horizontal_spacing / 2
+        return self._rightmost(first_layer, last_layer) + self.horizontal_spacing / 2
+    
+    def _route_connections(self):
+        """Прокладывает все линии соединений: список точек на каждую"""
+        self.routes_right = self.routes_bottom = 0
+        self.edges = []
+        self.back_lanes = {}
+        self.tracks = []
+        if not self.blocks:
+            return []
+        self._prepare_routing()
+        self.edges = edges = list(self._edges())
+        self.back_lanes = self._assign_back_lanes(edges)
+        self.tracks = self._assign_tracks(edges)
+
+        return [self._connection_points(k) for k in range(len(edges))]
+    
+    def _route(self, k):
+        """Ортогональный маршрут линии номер k по её дорожкам в каналах: список точек"""
+        blocks = self.blocks
+        from_block, to_block, is_true_branch = self.edges[k]
+        if not is_true_branch and blocks.block_type(from_block) == "decision":
+            # Из правой точки ромба - вбок и вниз
+            start = blocks.right_center(from_block)
+            points = [(start.x, start.y), (start.x + self.branch_exit, start.y)]
+        else:
+            # Из нижней точки блока
+            start = blocks.bottom_center(from_block)
+            points = [(start.x, start.y)]
         
-        # Промежуточная точка для плавного изгиба
-        mid_y = (start_y + end_y) / 2
+        end = blocks.top_center(to_block)
+        from_layer, to_layer = blocks.layer[from_block], blocks.layer[to_block]
+        below_offset, above_offset = self.tracks[k]
+        below = self.channels[from_layer + 1] + below_offset
+        above = self.channels[to_layer] + above_offset
+        x = points[-1][0]
         
-        path = f"M {start_x:.1f} {start_y:.1f} " \
-               f"L {start_x:.1f} {mid_y:.1f} " \
-               f"L {end_x:.1f} {mid_y:.1f} " \
-               f"L {end_x:.1f} {end_y:.1f}"
+        if to_layer <= from_layer:
+            # Обратная дуга цикла: по боковому каналу справа
+            lane = self.back_lanes[to_block]
+            points += [(x, below), (lane, below), (lane, above)]
+        elif to_layer > from_layer + 1:
+            # Длинная дуга: вертикаль в обход блоков промежуточных слоёв
+            lane = self._free_lane(end.x, below, above, from_layer + 1, to_layer - 1)
+            points += [(x, below), (lane, below), (lane, above)]
+        else:
+            points += [(x, below)]
+        points += [(end.x, above), (end.x, end.y)]
+        return points
+    
+    def _connection_points(self, k):
+        """Точки линии соединения номер k без повторов и лишних изломов"""
+        points = []
+        for point in self._route(k):
+            if points and abs(point[0] - points[-1][0]) < 0.05 and abs(point[1] - points[-1][1]) < 0.05:
+                continue
+            # Точка на одной прямой с двумя предыдущими лишняя
+            if len(points) >= 2 and (points[-2][0] == points[-1][0] == point[0] or points[-2][1] == points[-1][1] == point[1]):
+                points[-1] = point
+            else:
+                points.append(point)
+        self.routes_right = max(self.routes_right, max(x for x, _ in points))
+        self.routes_bottom = max(self.routes_bottom, max(y for _, y in points))
+        return points
+    
+    def _draw_connection(self, points):
+        """Рисует линию соединения по её точкам"""
+        path = "M " + " L ".join(f"{x:.1f} {y:.1f}" for x, y in points)
         
         return f'<path d="{path}" class="line" marker-end="url(#arrowhead)"/>\n'
 
@@ -384,38 +1314,16 @@ def main():
     # Создаем пример данных
     json_data = create_sample_flowchart()
     
-    # Создаем рендерер и генерируем SVG
+    # Создаем рендерер и пишем SVG прямо в файл
     renderer = FlowchartRenderer(json_data)
-    svg_content = renderer.generate_svg()
-    
-    # Сохраняем в файл
     with open("flowchart.svg", "w", encoding="utf-8") as f:
-        f.write(svg_content)
+        renderer.render_to(f)
     
     print("Блок-схема сохранена в файл flowchart.svg")
     
-    # Также создаем HTML для просмотра
-    html_content = f'''
-<!DOCTYPE html>
-<html>
-<head>
-    <title>Блок-схема selectionSort</title>
-    <style>
-        body {{ font-family: Arial, sans-serif; margin: 20px; }}
-        .container {{ text-align: center; }}
-    </style>
-</head>
-<body>
-    <div class="container">
-        <h1>Блок-схема функции selectionSort</h1>
-        {svg_content}
-    </div>
-</body>
-</html>
-'''
-    
+    # Также создаем HTML для просмотра, раскладка уже посчитана
     with open("flowchart.html", "w", encoding="utf-8") as f:
-        f.write(html_content)
+        renderer.render_to(f, html=True, relayout=False)
     
     print("HTML версия сохранена в файл flowchart.html")
 
@@ -1,14 +1,41 @@
-from parser import *
+import importlib
 
-if __name__ == 'main':
-    import json
-    from parser.parser import parserCPP
 
-    file_path = '../data/test.cpp'
-    with open(file_path, 'r', encoding='utf-8') as file:
-        bytes_file = bytes(file.read(), 'utf8')
+# public names -> the submodule defining them; a submodule is imported on first access,
+# so `import parser` loads neither tree-sitter nor the simplify rules
+_EXPORTS = {
+    'language': 'parser.parser',
+    'get_parser': 'parser.parser',
+    'parse': 'parser.parser',
+    'parse_many': 'parser.parser',
+    'ParserPool': 'parser.parser',
+    'parserCPP': 'parser.parser',
+    'parserCPP_to_stream': 'parser.parser',
+    'tree_to_json': 'parser.parser',
+    'write_tree': 'parser.parser',
+    'walk_tree': 'parser.parser',
+    'write_binary_tree': 'parser.binary',
+    'parserCPP_to_binary': 'parser.binary',
+    'BinaryTree': 'parser.binary',
+    'Simplifier': 'parser.simplify',
+    'simplify_source': 'parser.simplify',
+    'FunctionIndex': 'parser.simplify',
+    'SymbolTable': 'parser.symbols',
+    'build_symbols': 'parser.symbols',
+    'CppDocument': 'parser.document',
+    'build_flowcharts': 'parser.flowchart',
+}
 
-    data = parserCPP(bytes_file)
+__all__ = list(_EXPORTS)
 
-    with open('../output/output_cpp.json', 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_EXPORTS[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,85 @@
+import argparse
+import sys
+
+
+def run_ast(args):
+    from parser.parser import parserCPP_to_stream
+
+    with open(args.source, 'rb') as f:
+        source = f.read()
+    if args.binary:
+        from parser.binary import parserCPP_to_binary
+
+        with open(args.output, 'wb') as f:
+            parserCPP_to_binary(source, f, named_only=args.named_only, max_depth=args.max_depth)
+        return 0
+    with open(args.output, 'w', encoding='utf-8') as f:
+        parserCPP_to_stream(
+            source, f,
+            indent=args.indent, named_only=args.named_only, ranges=args.ranges,
+            compact=args.compact, max_depth=args.max_depth, ndjson=args.ndjson,
+        )
+    return 0
+
+
+def run_simplify(args):
+    from parser.simplify import simplify_source
+
+    with open(args.source, 'r', encoding='utf-8') as f:
+        lines = simplify_source(f.read())
+    if not args.quiet:
+        for line in lines:
+            print(line)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for line in lines:
+            f.write(line + '\n')
+    return 0
+
+
+def run_batch(args):
+    from parser.batch import main
+
+    return main(args.arguments)
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(prog='python -m parser', description='C++ sources to tree-sitter JSON and simplified lines')
+    commands = arguments.add_subparsers(dest='command', required=True)
+
+    ast = commands.add_parser('ast', help='write the tree-sitter syntax tree as JSON')
+    ast.add_argument('source', nargs='?', default='data/test.cpp')
+    ast.add_argument('-o', '--output', default=None, help='output/output_cpp.json, output/output_cpp.ast with --binary')
+    ast.add_argument('--indent', type=int, default=4, help='0 writes one line')
+    ast.add_argument('--named-only', action='store_true', help='skip anonymous nodes such as punctuation')
+    ast.add_argument('--ranges', action='store_true', help='give every node start and end byte offsets instead of its text')
+    ast.add_argument('--compact', action='store_true', help='nodes as [type, text, children] arrays instead of objects')
+    ast.add_argument('--max-depth', type=int, default=None)
+    ast.add_argument('--ndjson', action='store_true', help='one node per line instead of a nested document')
+    ast.add_argument('--binary', action='store_true', help='fixed-width node records over the source bytes, read with parser.binary.BinaryTree')
+    ast.set_defaults(run=run_ast)
+
+    simplify = commands.add_parser('simplify', help='write the simplified lines of a lab file')
+    simplify.add_argument('source', nargs='?', default='data/file.txt')
+    simplify.add_argument('-o', '--output', default='output/output.txt')
+    simplify.add_argument('-q', '--quiet', action='store_true', help='do not echo the lines')
+    simplify.set_defaults(run=run_simplify)
+
+    batch = commands.add_parser('batch', help='parse and simplify many sources in parallel', add_help=False)
+    batch.set_defaults(run=run_batch)
+
+    # everything after `batch` is handed to parser.batch as it is, the other commands take no extras
+    args, extra = arguments.parse_known_args(argv)
+    if args.command != 'batch' and extra:
+        arguments.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.arguments = extra
+    if args.command == 'ast' and args.compact and args.ndjson:
+        arguments.error('--compact has no --ndjson form')
+    if args.command == 'ast' and args.indent == 0:
+        args.indent = None
+    if args.command == 'ast' and args.output is None:
+        args.output = 'output/output_cpp.ast' if args.binary else 'output/output_cpp.json'
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
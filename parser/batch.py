@@ -0,0 +1,120 @@
+import argparse
+import glob
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+
+SOURCE_SUFFIXES = ('.cpp', '.cc', '.cxx', '.h', '.hpp', '.txt')
+
+
+def collect_paths(target):
+    # a directory is searched recursively for sources, anything else is taken as a glob pattern
+    if os.path.isdir(target):
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(target)
+            for name in names
+            if name.endswith(SOURCE_SUFFIXES)
+        ]
+    else:
+        paths = [path for path in glob.glob(target, recursive=True) if os.path.isfile(path)]
+    return sorted(paths)
+
+
+def process_file(task):
+    # runs in a worker process, the tree-sitter parser is built on the first file and reused after
+    path, out_path, ast, simplified, binary = task
+    record = {'source': path, 'outputs': [], 'seconds': {}, 'error': None}
+    started = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            source = f.read()
+        os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+
+        if ast and binary:
+            from parser.binary import parserCPP_to_binary
+
+            stage = time.perf_counter()
+            with open(out_path + '.ast', 'wb') as f:
+                parserCPP_to_binary(source, f)
+            record['seconds']['ast'] = time.perf_counter() - stage
+            record['outputs'].append(out_path + '.ast')
+        elif ast:
+            from parser.parser import parserCPP_to_stream
+
+            stage = time.perf_counter()
+            with open(out_path + '.ast.json', 'w', encoding='utf-8') as f:
+                parserCPP_to_stream(source, f)
+            record['seconds']['ast'] = time.perf_counter() - stage
+            record['outputs'].append(out_path + '.ast.json')
+
+        if simplified:
+            from parser.simplify import simplify_source
+
+            stage = time.perf_counter()
+            lines = simplify_source(source.decode('utf8'))
+            with open(out_path + '.simplified.txt', 'w', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(line + '\n')
+            record['seconds']['simplified'] = time.perf_counter() - stage
+            record['outputs'].append(out_path + '.simplified.txt')
+    except Exception as error:
+        record['error'] = f'{type(error).__name__}: {error}'
+        record['traceback'] = traceback.format_exc()
+    record['seconds']['total'] = time.perf_counter() - started
+    return record
+
+
+def run_batch(paths, out_dir, jobs=None, ast=True, simplified=True, binary=False):
+    # per-file outputs keep the sources' relative layout under out_dir, manifest.json sums the run up
+    paths = list(paths)
+    jobs = jobs or os.cpu_count() or 1
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ''
+    tasks = [
+        (path, os.path.join(out_dir, os.path.relpath(os.path.abspath(path), base)), ast, simplified, binary)
+        for path in paths
+    ]
+
+    started = time.perf_counter()
+    if jobs == 1:
+        records = [process_file(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunksize = max(1, len(tasks) // (jobs * 4))
+            records = list(executor.map(process_file, tasks, chunksize=chunksize))
+
+    manifest = {
+        'jobs': jobs,
+        'seconds': time.perf_counter() - started,
+        'processed': len(records),
+        'failed': sum(record['error'] is not None for record in records),
+        'files': records,
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    return manifest
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description='Parse and simplify many C++ sources in parallel')
+    arguments.add_argument('target', help='directory or glob pattern of sources')
+    arguments.add_argument('-o', '--output', default='output/batch', help='directory for results and manifest.json')
+    arguments.add_argument('-j', '--jobs', type=int, default=None, help='worker processes, all cores by default')
+    arguments.add_argument('--no-ast', action='store_true', help='skip the tree-sitter JSON')
+    arguments.add_argument('--no-simplified', action='store_true', help='skip the simplified lines')
+    arguments.add_argument('--binary', action='store_true', help='write the tree as a binary .ast instead of JSON')
+    args = arguments.parse_args(argv)
+
+    output = os.path.abspath(args.output)
+    paths = [path for path in collect_paths(args.target) if not os.path.abspath(path).startswith(output + os.sep)]
+    manifest = run_batch(paths, args.output, args.jobs, not args.no_ast, not args.no_simplified, args.binary)
+    print(f"{manifest['processed']} files, {manifest['failed']} failed, {manifest['seconds']:.2f} s")
+    return 1 if manifest['failed'] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
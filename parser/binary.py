@@ -0,0 +1,241 @@
+import mmap
+import struct
+import sys
+from array import array
+
+import tracing
+from parser.parser import parse, walk_tree
+
+
+# file layout: header, node records, type names, source bytes; every integer is little-endian
+MAGIC = b'CAST'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIIQQQ')
+# a record is six int32: type id | flags << 16, parent, first child, next sibling, start byte, end byte; -1 is no node
+RECORD_FIELDS = 6
+RECORD_SIZE = 4 * RECORD_FIELDS
+NAMED = 1 << 16
+NAMED_ONLY = 1
+
+TYPE, PARENT, FIRST_CHILD, NEXT_SIBLING, START, END = range(RECORD_FIELDS)
+
+
+def write_binary_tree(node, source, fp, named_only=False, max_depth=None):
+    # nodes are numbered in document order, so the root is node 0 and a subtree is a contiguous id range
+    with tracing.span('write_binary_tree'):
+        records, type_names = _build_records(node, named_only, max_depth)
+        count = len(records) // RECORD_FIELDS
+        tracing.count('nodes visited', count)
+        types = '\0'.join(type_names).encode('utf8')
+        types_offset = HEADER.size + len(records) * 4
+        source_offset = types_offset + len(types)
+        fp.write(HEADER.pack(
+            MAGIC, VERSION, NAMED_ONLY if named_only else 0, count, len(type_names), types_offset, source_offset, len(source),
+        ))
+        if sys.byteorder != 'little':
+            records.byteswap()
+        fp.write(records.tobytes())
+        fp.write(types)
+        fp.write(source)
+        return count
+
+
+def _build_records(node, named_only, max_depth):
+    records = array('i')
+    kinds = {}
+    type_names = []
+    parents = []
+    previous = []
+    for node_id, (depth, current) in enumerate(walk_tree(node, named_only, max_depth)):
+        type_id = kinds.get(current.kind_id)
+        if type_id is None:
+            type_id = kinds[current.kind_id] = len(type_names)
+            type_names.append(current.type)
+        del parents[depth:]
+        parent = parents[-1] if parents else -1
+        if len(previous) > depth:
+            records[previous[depth] * RECORD_FIELDS + NEXT_SIBLING] = node_id
+        elif parent >= 0:
+            records[parent * RECORD_FIELDS + FIRST_CHILD] = node_id
+        del previous[depth:]
+        previous.append(node_id)
+        records.extend((type_id | (NAMED if current.is_named else 0), parent, -1, -1, current.start_byte, current.end_byte))
+        parents.append(node_id)
+    return records, type_names
+
+
+def parserCPP_to_binary(bytes, fp, **options):
+    with tracing.span('parserCPP_to_binary'):
+        return write_binary_tree(parse(bytes).root_node, bytes, fp, **options)
+
+
+class BinaryTree:
+    """A binary AST read in place: the records are a view over the buffer, nodes are decoded only when touched"""
+
+    def __init__(self, buffer):
+        magic, version, flags, count, type_count, types_offset, source_offset, source_length = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError('not a binary AST')
+        if version != VERSION:
+            raise ValueError(f'binary AST version {version} is not supported')
+        self.buffer = buffer
+        self.named_only = bool(flags & NAMED_ONLY)
+        self.count = count
+        view = memoryview(buffer)
+        records = view[HEADER.size:types_offset]
+        if sys.byteorder == 'little':
+            self.records = records.cast('i')
+        else:
+            self.records = array('i', records)
+            self.records.byteswap()
+        names = bytes(view[types_offset:source_offset]).decode('utf8')
+        self.type_names = tuple(names.split('\0')) if type_count else ()
+        self.source = view[source_offset:source_offset + source_length]
+        self._mmap = None
+        self._file = None
+
+    @classmethod
+    def open(cls, path):
+        # the file is mapped, not read: opening costs the same for any size and pages load as nodes are touched
+        f = open(path, 'rb')
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            f.close()
+            raise
+        tree = cls(mapped)
+        tree._mmap, tree._file = mapped, f
+        return tree
+
+    def close(self):
+        # the views go first, a mapping with exported buffers cannot be closed
+        for view in (self.records, self.source):
+            if isinstance(view, memoryview):
+                view.release()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (BinaryNode(self, node_id) for node_id in range(self.count))
+
+    @property
+    def root_node(self):
+        return BinaryNode(self, 0) if self.count else None
+
+    def node(self, node_id):
+        if not 0 <= node_id < self.count:
+            raise IndexError(node_id)
+        return BinaryNode(self, node_id)
+
+    def field(self, node_id, field):
+        return self.records[node_id * RECORD_FIELDS + field]
+
+    def nodes_of_type(self, type_name):
+        # a scan of the type column, no node views are built for the misses
+        if type_name not in self.type_names:
+            return []
+        type_id = self.type_names.index(type_name)
+        records = self.records
+        return [
+            BinaryNode(self, node_id) for node_id in range(self.count)
+            if records[node_id * RECORD_FIELDS] & 0xFFFF == type_id
+        ]
+
+
+class BinaryNode:
+    """One node of a BinaryTree, named after the tree-sitter Node attributes it stands in for"""
+
+    __slots__ = ('tree', 'id')
+
+    def __init__(self, tree, node_id):
+        self.tree = tree
+        self.id = node_id
+
+    def __eq__(self, other):
+        return isinstance(other, BinaryNode) and other.tree is self.tree and other.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.tree), self.id))
+
+    def __repr__(self):
+        return f'<BinaryNode {self.id} {self.type} [{self.start_byte}, {self.end_byte}]>'
+
+    def _link(self, field):
+        node_id = self.tree.field(self.id, field)
+        return BinaryNode(self.tree, node_id) if node_id >= 0 else None
+
+    @property
+    def type(self):
+        return self.tree.type_names[self.tree.field(self.id, TYPE) & 0xFFFF]
+
+    @property
+    def is_named(self):
+        return bool(self.tree.field(self.id, TYPE) & NAMED)
+
+    @property
+    def start_byte(self):
+        return self.tree.field(self.id, START)
+
+    @property
+    def end_byte(self):
+        return self.tree.field(self.id, END)
+
+    @property
+    def text(self):
+        return bytes(self.tree.source[self.start_byte:self.end_byte])
+
+    @property
+    def parent(self):
+        return self._link(PARENT)
+
+    @property
+    def next_sibling(self):
+        return self._link(NEXT_SIBLING)
+
+    @property
+    def children(self):
+        children = []
+        node_id = self.tree.field(self.id, FIRST_CHILD)
+        while node_id >= 0:
+            children.append(BinaryNode(self.tree, node_id))
+            node_id = self.tree.field(node_id, NEXT_SIBLING)
+        return children
+
+    @property
+    def named_children(self):
+        return [child for child in self.children if child.is_named]
+
+    @property
+    def child_count(self):
+        return len(self.children)
+
+    def walk(self):
+        # yields (depth, node) in document order like walk_tree: the subtree is a run of ids,
+        # depths come from the parent links
+        tree = self.tree
+        depths = {self.id: -1}
+        for node_id in range(self.id, self._subtree_end()):
+            depth = depths[node_id] = depths.get(tree.field(node_id, PARENT), -1) + 1
+            yield depth, BinaryNode(tree, node_id)
+
+    def _subtree_end(self):
+        # the subtree stops where the next sibling of the node, or of its nearest ancestor having one, starts
+        tree = self.tree
+        node_id = self.id
+        while node_id >= 0:
+            following = tree.field(node_id, NEXT_SIBLING)
+            if following >= 0:
+                return following
+            node_id = tree.field(node_id, PARENT)
+        return tree.count
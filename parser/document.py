@@ -0,0 +1,69 @@
+from parser.parser import get_parser, tree_to_json
+
+
+def point_at(source, offset):
+    row = source.count(b'\n', 0, offset)
+    column = offset - (source.rfind(b'\n', 0, offset) + 1)
+    return row, column
+
+
+def function_name(node):
+    declarator = node.child_by_field_name('declarator')
+    while declarator is not None and declarator.child_by_field_name('declarator') is not None:
+        declarator = declarator.child_by_field_name('declarator')
+    return declarator.text.decode('utf8') if declarator is not None else None
+
+
+class CppDocument:
+    # keeps the last tree so every edit is parsed incrementally from it
+
+    def __init__(self, source=b''):
+        if isinstance(source, str):
+            source = source.encode('utf8')
+        self.source = source
+        self.tree = get_parser().parse(source)
+
+    def edit(self, start_byte, old_end_byte, new_text):
+        # replaces source[start_byte:old_end_byte] with new_text, returns the changed (start, end) byte ranges
+        if isinstance(new_text, str):
+            new_text = new_text.encode('utf8')
+        new_end_byte = start_byte + len(new_text)
+        source = self.source[:start_byte] + new_text + self.source[old_end_byte:]
+
+        old_tree = self.tree
+        old_tree.edit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=new_end_byte,
+            start_point=point_at(self.source, start_byte),
+            old_end_point=point_at(self.source, old_end_byte),
+            new_end_point=point_at(source, new_end_byte),
+        )
+        self.tree = get_parser().parse(source, old_tree)
+        self.source = source
+
+        # changed_ranges only covers structural changes, the edited text itself is always included
+        ranges = [(changed.start_byte, changed.end_byte) for changed in old_tree.changed_ranges(self.tree)]
+        ranges.append((start_byte, new_end_byte))
+        return ranges
+
+    def functions(self):
+        return [node for node in self.tree.root_node.named_children if node.type == 'function_definition']
+
+    def affected_functions(self, ranges):
+        # top-level function definitions touching any of the ranges, in source order
+        root = self.tree.root_node
+        affected = {}
+        for start, end in ranges:
+            node = root.first_named_child_for_byte(start)
+            while node is not None and node.start_byte <= end:
+                if node.type == 'function_definition':
+                    affected[node.start_byte] = node
+                node = node.next_named_sibling
+        return [affected[start] for start in sorted(affected)]
+
+    def function_source(self, node):
+        return self.source[node.start_byte:node.end_byte].decode('utf8')
+
+    def to_json(self, **options):
+        return tree_to_json(self.tree.root_node, **options)
@@ -0,0 +1,280 @@
+from parser.document import function_name
+from parser.parser import get_parser
+
+
+def node_text(node):
+    return ' '.join(node.text.decode('utf8').split())
+
+
+def condition_text(node):
+    # condition_clause / parenthesized_expression -> the expression without its parentheses
+    value = node.child_by_field_name('value')
+    if value is not None:
+        return node_text(value)
+    text = node_text(node)
+    if text[:1] == '(' and text[-1:] == ')':
+        text = text[1:-1].strip()
+    return text
+
+
+class Scope:
+    # where break and continue of the innermost loop or switch lead
+    def __init__(self, is_loop):
+        self.is_loop = is_loop
+        self.breaks = []
+        self.continues = []
+
+
+class FlowchartBuilder:
+    """Turns one function_definition into the {"function", "flowchart"} dict FlowchartRenderer draws"""
+
+    def __init__(self):
+        self.blocks = {}
+        self.created = []
+        self.scopes = []
+
+    def add_block(self, block_type, ports, **fields):
+        block_id = f'{block_type}_{len(self.created) + 1}'
+        self.blocks[block_id] = {'type': block_type, **fields}
+        self.created.append(block_id)
+        self.connect(ports, block_id)
+        return block_id
+
+    def connect(self, ports, target):
+        for block_id, branch in ports:
+            self.blocks[block_id][branch] = target
+
+    def build(self, node):
+        name = function_name(node)
+        self.blocks = {'start': {'type': 'start', 'label': f'Начало {name}'}}
+        self.created = []
+        self.scopes = []
+
+        _, exits = self.statement(node.child_by_field_name('body'), [('start', 'next')])
+        self.connect(exits, 'end')
+        self.blocks['end'] = {'type': 'end', 'label': f'Конец {name}'}
+        return {'function': self.signature(node, name), 'flowchart': self.blocks}
+
+    def signature(self, node, name):
+        parameters = []
+        declarator = node.child_by_field_name('declarator')
+        while declarator is not None and declarator.type != 'function_declarator':
+            declarator = declarator.child_by_field_name('declarator')
+        parameter_list = declarator.child_by_field_name('parameters') if declarator is not None else None
+        for parameter in parameter_list.named_children if parameter_list is not None else ():
+            if parameter.type != 'parameter_declaration':
+                continue
+            entry = {'name': '', 'type': node_text(parameter.child_by_field_name('type'))}
+            inner = parameter.child_by_field_name('declarator')
+            if inner is not None and inner.type == 'reference_declarator':
+                entry['reference'] = True
+            while inner is not None and inner.type not in ('identifier', 'field_identifier'):
+                inner = inner.child_by_field_name('declarator') or (inner.named_children or [None])[0]
+            entry['name'] = node_text(inner) if inner is not None else ''
+            parameters.append(entry)
+        return_type = node.child_by_field_name('type')
+        return {
+            'name': name,
+            'parameters': parameters,
+            'returnType': node_text(return_type) if return_type is not None else '',
+        }
+
+    def sequence(self, nodes, ports):
+        # the entry is the first block the incoming ports reach: statements drawing nothing pass the ports on,
+        # a break or continue before any block sends them elsewhere and leaves no entry
+        entry = None
+        passing = True
+        for child in nodes:
+            child_entry, exits = self.statement(child, ports)
+            if passing and child_entry is not None:
+                entry = child_entry
+            if child_entry is not None or exits != ports:
+                passing = False
+            ports = exits
+        return entry, ports
+
+    def statement(self, node, ports):
+        # ports are the (block id, branch) pairs still waiting for their next block; returns the statement's
+        # entry block (None when it draws nothing the ports lead to) and the ports left open after it
+        if node is None:
+            return None, ports
+        handler = getattr(self, f'_{node.type}', None)
+        if handler is not None:
+            return handler(node, ports)
+        if node.type == 'comment' or not node.is_named:
+            return None, ports
+        label = node_text(node).rstrip(';').rstrip()
+        if not label:
+            return None, ports
+        return self.operation(ports, label)
+
+    def operation(self, ports, label):
+        block_id = self.add_block('operation', ports, label=label)
+        return block_id, [(block_id, 'next')]
+
+    def _compound_statement(self, node, ports):
+        return self.sequence(node.named_children, ports)
+
+    def _declaration(self, node, ports):
+        # declarations without an initializer draw nothing
+        values = [node_text(child) for child in node.children_by_field_name('declarator') if child.type == 'init_declarator']
+        if not values:
+            return None, ports
+        return self.operation(ports, ', '.join(values))
+
+    def _expression_statement(self, node, ports):
+        if not node.named_children:
+            return None, ports
+        return self.operation(ports, node_text(node.named_children[0]))
+
+    def _if_statement(self, node, ports):
+        decision = self.add_block('decision', ports, condition=condition_text(node.child_by_field_name('condition')))
+        _, exits = self.statement(node.child_by_field_name('consequence'), [(decision, 'true')])
+        alternative = node.child_by_field_name('alternative')
+        if alternative is not None and alternative.type == 'else_clause':
+            exits += self.sequence(alternative.named_children, [(decision, 'false')])[1]
+        elif alternative is not None:
+            exits += self.statement(alternative, [(decision, 'false')])[1]
+        else:
+            exits.append((decision, 'false'))
+        return decision, exits
+
+    def _loop(self, condition, body, update, ports):
+        # shared by for and while: condition -> body -> update -> condition
+        scope = Scope(is_loop=True)
+        self.scopes.append(scope)
+        if condition is not None:
+            head = self.add_block('decision', ports, condition=condition)
+            _, body_exits = self.statement(body, [(head, 'true')])
+        else:
+            head, body_exits = self.statement(body, ports)
+        self.scopes.pop()
+
+        # an update nothing reaches (the body always breaks or returns) is not drawn
+        loop_end = body_exits + scope.continues
+        if update is not None and loop_end:
+            update_block, loop_end = self.operation(loop_end, update)
+            if head is None:
+                head = update_block
+        if head is None and loop_end:
+            # for (;;) {} with nothing to draw inside
+            head, loop_end = self.operation(loop_end, 'for (;;)')
+        # for (;;) { break; } draws nothing, its breaks carry the incoming ports on
+        if head is not None:
+            self.connect(loop_end, head)
+        exits = scope.breaks
+        if condition is not None:
+            exits.insert(0, (head, 'false'))
+        return head, exits
+
+    def _for_statement(self, node, ports):
+        entry = None
+        initializer = node.child_by_field_name('initializer')
+        if initializer is not None:
+            entry, ports = self.statement(initializer, ports) if initializer.type == 'declaration' else \
+                self.operation(ports, node_text(initializer))
+        condition = node.child_by_field_name('condition')
+        update = node.child_by_field_name('update')
+        head, exits = self._loop(
+            condition_text(condition) if condition is not None else None,
+            node.child_by_field_name('body'),
+            node_text(update) if update is not None else None,
+            ports,
+        )
+        return entry if entry is not None else head, exits
+
+    def _for_range_loop(self, node, ports):
+        condition = f"{node_text(node.child_by_field_name('declarator'))} : {node_text(node.child_by_field_name('right'))}"
+        return self._loop(condition, node.child_by_field_name('body'), None, ports)
+
+    def _while_statement(self, node, ports):
+        return self._loop(condition_text(node.child_by_field_name('condition')), node.child_by_field_name('body'), None, ports)
+
+    def _do_statement(self, node, ports):
+        scope = Scope(is_loop=True)
+        self.scopes.append(scope)
+        entry, body_exits = self.statement(node.child_by_field_name('body'), ports)
+        self.scopes.pop()
+
+        loop_end = body_exits + scope.continues
+        if not loop_end:
+            # do { break; } while (y): nothing reaches the condition, so it is not drawn
+            return entry, scope.breaks
+        decision = self.add_block('decision', loop_end, condition=condition_text(node.child_by_field_name('condition')))
+        if entry is None:
+            # an empty body: the condition is the loop
+            entry = decision
+        self.blocks[decision]['true'] = entry
+        return entry, [(decision, 'false')] + scope.breaks
+
+    def _switch_statement(self, node, ports):
+        # a chain of decisions, one per case; a case without break falls into the next one's body
+        subject = condition_text(node.child_by_field_name('condition'))
+        scope = Scope(is_loop=False)
+        self.scopes.append(scope)
+        entry = None
+        falling = []
+        # default is drawn where it stands in the source, the false port of the last decision only exists
+        # after every case, so a placeholder port enters the default body and is resolved at the end
+        unmatched = None
+        body = node.child_by_field_name('body')
+        for case in body.named_children if body is not None else ():
+            if case.type != 'case_statement':
+                continue
+            value = case.child_by_field_name('value')
+            statements = [child for child in case.named_children if value is None or child != value]
+            if value is None:
+                unmatched = (f'default of switch {len(self.scopes)}', 'next')
+                self.blocks[unmatched[0]] = {}
+                _, falling = self.sequence(statements, falling + [unmatched])
+                continue
+            decision = self.add_block('decision', ports, condition=f'{subject} == {node_text(value)}')
+            if entry is None:
+                entry = decision
+            ports = [(decision, 'false')]
+            _, falling = self.sequence(statements, [(decision, 'true')] + falling)
+        self.scopes.pop()
+        if unmatched is None:
+            return entry, ports + falling + scope.breaks
+
+        target = self.blocks.pop(unmatched[0]).get('next')
+        if target is not None:
+            self.connect(ports, target)
+            return entry if entry is not None else target, falling + scope.breaks
+        # the default body drew nothing before leaving: no match goes wherever its fall-through, break or continue goes
+        for waiting in [falling, scope.breaks] + [outer.continues for outer in self.scopes]:
+            if unmatched in waiting:
+                position = waiting.index(unmatched)
+                waiting[position:position + 1] = ports
+        return entry, falling + scope.breaks
+
+    def _break_statement(self, node, ports):
+        if self.scopes:
+            self.scopes[-1].breaks.extend(ports)
+        return None, []
+
+    def _continue_statement(self, node, ports):
+        for scope in reversed(self.scopes):
+            if scope.is_loop:
+                scope.continues.extend(ports)
+                break
+        return None, []
+
+    def _return_statement(self, node, ports):
+        block_id, exits = self.operation(ports, node_text(node).rstrip(';').rstrip())
+        self.connect(exits, 'end')
+        return block_id, []
+
+
+def build_flowcharts(source, names=None):
+    # one flowchart dict per top-level function of the C++ source, in source order
+    if isinstance(source, str):
+        source = source.encode('utf8')
+    flowcharts = []
+    for node in get_parser().parse(source).root_node.named_children:
+        if node.type != 'function_definition':
+            continue
+        if names is not None and function_name(node) not in names:
+            continue
+        flowcharts.append(FlowchartBuilder().build(node))
+    return flowcharts
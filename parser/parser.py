@@ -1,27 +1,241 @@
-from tree_sitter import Language, Parser
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-import tree_sitter_cpp
+import tracing
 
 
-CPP_LANGUAGE = Language(tree_sitter_cpp.language())
-parser_cpp = Parser(CPP_LANGUAGE)
+# tree-sitter is loaded on first use, importing the package or rendering charts never pays for it
+_language = None
+_language_lock = threading.Lock()
 
 
-def parserCPP(bytes):
-    return tree_to_json(parser_cpp.parse(bytes).root_node)
+def language():
+    global _language
+    if _language is None:
+        with _language_lock:
+            if _language is None:
+                import tree_sitter_cpp
+                from tree_sitter import Language
 
+                _language = Language(tree_sitter_cpp.language())
+    return _language
 
-def tree_to_json(node):
-    result = {
-        'type': node.type,
-        'text': node.text.decode('utf8') if node.child_count == 0 else None,
-    }
-    
-    children = []
-    for child in node.children:
-        children.append(tree_to_json(child))
-    
-    if children:
-        result['children'] = children
-    
-    return result
+
+class ParserPool:
+    """Hands every thread its own Parser over the shared Language, a Parser keeps per-parse state"""
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def get(self):
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            from tree_sitter import Parser
+
+            parser = self._local.parser = Parser(language())
+            with self._lock:
+                self.created += 1
+        return parser
+
+    def parse(self, source):
+        with tracing.span('parse', bytes=len(source)):
+            return self.get().parse(source)
+
+
+_pool = ParserPool()
+
+
+def get_parser():
+    return _pool.get()
+
+
+def __getattr__(name):
+    # the former module globals, built lazily for code that still imports them
+    if name == 'CPP_LANGUAGE':
+        return language()
+    if name == 'parser_cpp':
+        return get_parser()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def parse(bytes):
+    return _pool.parse(bytes)
+
+
+def parse_many(sources, max_workers=None, as_json=False, pool=None, **options):
+    # trees, or tree_to_json dicts with as_json, in the order of sources; every worker thread parses with its own Parser
+    pool = pool or _pool
+
+    def work(source):
+        tree = pool.parse(source)
+        return tree_to_json(tree.root_node, **options) if as_json else tree
+
+    if max_workers == 1:
+        return [work(source) for source in sources]
+    with ThreadPoolExecutor(max_workers) as executor:
+        return list(executor.map(work, sources))
+
+
+def parserCPP(bytes, **options):
+    with tracing.span('parserCPP'):
+        return tree_to_json(parse(bytes).root_node, **options)
+
+
+def parserCPP_to_stream(bytes, fp, **options):
+    with tracing.span('parserCPP_to_stream'):
+        write_tree(parse(bytes).root_node, fp, **options)
+
+
+def walk_tree(node, named_only=False, max_depth=None):
+    # yields (depth, node) in document order without recursion
+    cursor = node.walk()
+    depth = 0
+    while True:
+        current = cursor.node
+        if current.is_named or not named_only:
+            yield depth, current
+            if (max_depth is None or depth < max_depth) and cursor.goto_first_child():
+                depth += 1
+                continue
+
+        while not cursor.goto_next_sibling():
+            if depth == 0 or not cursor.goto_parent():
+                return
+            depth -= 1
+        if depth == 0:
+            return
+
+
+def _node_fields(node, named_only, ranges, type_names):
+    kind = node.kind_id
+    type_name = type_names.get(kind)
+    if type_name is None:
+        type_name = type_names[kind] = node.type
+    if ranges:
+        return type_name, (node.start_byte, node.end_byte)
+    is_leaf = (node.named_child_count if named_only else node.child_count) == 0
+    return type_name, (node.text.decode('utf8') if is_leaf else None,)
+
+
+def tree_to_json(node, named_only=False, max_depth=None, ranges=False, compact=False):
+    # named_only skips punctuation and keywords, max_depth cuts the tree below that level,
+    # ranges gives [start_byte, end_byte] instead of leaf text, compact gives [type, text, children] arrays
+    # ([type, start, end, children] with ranges), children only when there are any
+    with tracing.span('tree_to_json'):
+        return _tree_to_json(node, named_only, max_depth, ranges, compact)
+
+
+def _tree_to_json(node, named_only, max_depth, ranges, compact):
+    type_names = {}
+    parents = []
+    root = None
+
+    visited = 0
+    for visited, (depth, current) in enumerate(walk_tree(node, named_only, max_depth), 1):
+        type_name, payload = _node_fields(current, named_only, ranges, type_names)
+        if compact:
+            entry = [type_name, *payload]
+        else:
+            entry = {'type': type_name}
+            if ranges:
+                entry['start'], entry['end'] = payload
+            else:
+                entry['text'] = payload[0]
+
+        del parents[depth:]
+        if parents:
+            _add_child(parents[-1], entry, compact)
+        else:
+            root = entry
+        parents.append(entry)
+
+    tracing.count('nodes visited', visited)
+    return root
+
+
+def _add_child(parent, entry, compact):
+    if not compact:
+        parent.setdefault('children', []).append(entry)
+    elif type(parent[-1]) is list:
+        parent[-1].append(entry)
+    else:
+        parent.append([entry])
+
+
+def write_tree(node, fp, named_only=False, max_depth=None, ranges=False, compact=False, ndjson=False, indent=None,
+               ensure_ascii=False):
+    # writes the same JSON as json.dump(tree_to_json(...)) node by node, holding only the open ancestors;
+    # ndjson writes one {"id", "parent", ...} object per line instead and has no compact form
+    if compact and ndjson:
+        raise ValueError('compact and ndjson cannot be combined')
+    with tracing.span('write_tree', ndjson=ndjson):
+        visited = _write_tree(node, fp, named_only, max_depth, ranges, compact, ndjson, indent, ensure_ascii)
+    tracing.count('nodes visited', visited)
+
+
+def _write_tree(node, fp, named_only, max_depth, ranges, compact, ndjson, indent, ensure_ascii):
+    type_names = {}
+    dumps = json.JSONEncoder(ensure_ascii=ensure_ascii).encode
+
+    if ndjson:
+        parents = []
+        node_id = -1
+        for node_id, (depth, current) in enumerate(walk_tree(node, named_only, max_depth)):
+            type_name, payload = _node_fields(current, named_only, ranges, type_names)
+            del parents[depth:]
+            fields = [f'"id": {node_id}', f'"parent": {parents[-1] if parents else "null"}', f'"type": {dumps(type_name)}']
+            if ranges:
+                fields += [f'"start": {payload[0]}', f'"end": {payload[1]}']
+            else:
+                fields.append(f'"text": {dumps(payload[0])}')
+            fp.write('{' + ', '.join(fields) + '}\n')
+            parents.append(node_id)
+        return node_id + 1
+
+    item_separator = ', ' if indent is None else ','
+
+    def newline(level):
+        return '' if indent is None else '\n' + ' ' * (indent * level)
+
+    # a node is an object with "type", "text" or "start"/"end" and "children" keys, or with compact
+    # an array of the same values without keys
+    if compact:
+        opening, closing = '[', ']'
+        type_key = text_key = start_key = end_key = children_key = ''
+    else:
+        opening, closing = '{', '}'
+        type_key, text_key, start_key, end_key, children_key = '"type": ', '"text": ', '"start": ', '"end": ', '"children": '
+
+    has_children = []
+    visited = 0
+
+    def close(depth):
+        while len(has_children) > depth:
+            level = 2 * (len(has_children) - 1)
+            if has_children.pop():
+                fp.write(newline(level + 1) + ']')
+            fp.write(newline(level) + closing)
+
+    for visited, (depth, current) in enumerate(walk_tree(node, named_only, max_depth), 1):
+        type_name, payload = _node_fields(current, named_only, ranges, type_names)
+        close(depth)
+        level = 2 * depth
+        if has_children:
+            if has_children[-1]:
+                fp.write(item_separator + newline(level))
+            else:
+                fp.write(item_separator + newline(level - 1) + children_key + '[' + newline(level))
+                has_children[-1] = True
+
+        fp.write(opening + newline(level + 1) + type_key + dumps(type_name))
+        if ranges:
+            fp.write(f'{item_separator}{newline(level + 1)}{start_key}{payload[0]}{item_separator}{newline(level + 1)}{end_key}{payload[1]}')
+        else:
+            fp.write(item_separator + newline(level + 1) + text_key + dumps(payload[0]))
+        has_children.append(False)
+
+    close(0)
+    return visited
@@ -0,0 +1,613 @@
+import re
+import time
+from bisect import bisect_left
+
+import tracing
+
+
+class Rule:
+    def __init__(self, name):
+        self.name = name
+        self.seconds = 0.0
+        self.hits = 0
+
+    def __call__(self, line):
+        raise NotImplementedError
+
+
+class Sub(Rule):
+    def __init__(self, name, pattern, repl):
+        super().__init__(name)
+        self.regex = re.compile(pattern)
+        self.repl = repl
+
+    def __call__(self, line):
+        line, count = self.regex.subn(self.repl, line)
+        self.hits += count
+        return line
+
+
+class Drop(Rule):
+    def __init__(self, name, pattern, full=False):
+        super().__init__(name)
+        regex = re.compile(pattern)
+        self.test = regex.fullmatch if full else regex.match
+
+    def __call__(self, line):
+        if self.test(line):
+            self.hits += 1
+            return None
+        return line
+
+
+class BlockComments(Rule):
+    # /* ... */ may span lines, so whether one is still open is carried over to the next line
+    def __init__(self, name):
+        super().__init__(name)
+        self.open = False
+
+    def __call__(self, line):
+        if not self.open and '/*' not in line:
+            return line
+        kept = []
+        pos = 0
+        while True:
+            if self.open:
+                end = line.find('*/', pos)
+                if end < 0:
+                    break
+                self.open = False
+                pos = end + 2
+            else:
+                start = line.find('/*', pos)
+                if start < 0:
+                    kept.append(line[pos:])
+                    break
+                kept.append(line[pos:start].rstrip())
+                self.open = True
+                pos = start + 2
+        self.hits += 1
+        return ''.join(kept)
+
+
+class Apply(Rule):
+    def __init__(self, name, func, guard=None):
+        super().__init__(name)
+        self.func = func
+        self.guard = re.compile(guard).search if guard else None
+
+    def __call__(self, line):
+        if self.guard is not None and not self.guard(line):
+            return line
+        self.hits += 1
+        return self.func(line)
+
+
+class Lookahead(Rule):
+    # keep(line, next_line) decides on a line once the following one is known, the last line gets an empty one
+    def __init__(self, name, keep):
+        super().__init__(name)
+        self.keep = keep
+
+    def __call__(self, line, next_line):
+        if self.keep(line, next_line):
+            return line
+        self.hits += 1
+        return None
+
+
+class Pipeline:
+    """Ordered rules; consecutive line rules are fused so every line goes through all of them in one pass"""
+
+    def __init__(self, rules, profile=False):
+        self.rules = list(rules)
+        self.profile = profile
+
+    def iter_rules(self):
+        for rule in self.rules:
+            yield rule.name, rule.seconds, rule.hits
+
+    def run(self, lines):
+        stream = iter(lines)
+        segment = []
+        for rule in self.rules:
+            if isinstance(rule, Lookahead):
+                if segment:
+                    stream = self._fused(stream, tuple(segment))
+                    segment = []
+                stream = self._lookahead(stream, rule)
+            else:
+                segment.append(rule)
+        if segment:
+            stream = self._fused(stream, tuple(segment))
+        return stream
+
+    def _fused(self, stream, rules):
+        if self.profile:
+            yield from self._fused_timed(stream, rules)
+            return
+        for line in stream:
+            for rule in rules:
+                line = rule(line)
+                if line is None:
+                    break
+            else:
+                yield line
+
+    def _fused_timed(self, stream, rules):
+        clock = time.perf_counter
+        for line in stream:
+            for rule in rules:
+                started = clock()
+                line = rule(line)
+                rule.seconds += clock() - started
+                if line is None:
+                    break
+            else:
+                yield line
+
+    def _lookahead(self, stream, rule):
+        clock = time.perf_counter
+        previous = None
+        for line in stream:
+            if previous is not None:
+                started = clock()
+                kept = rule(previous, line)
+                rule.seconds += clock() - started
+                if kept is not None:
+                    yield kept
+            previous = line
+        if previous is not None and rule(previous, '') is not None:
+            yield previous
+
+
+def replace_1st_scope_pair(string):
+    start = end = None
+    counter = 0
+    for indx, i in enumerate(string):
+        if i in '()':
+            if i == '(':
+                counter += 1
+                if counter == 1:
+                    start = indx
+            else:
+                counter -= 1
+            if i == ')' and counter == 0:
+                end = indx
+                break
+    if not (start is None or end is None):
+        return string[:start] + string[start + 1:end] + string[end + 1:]
+    return string
+
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+def replace_abs(string):
+    # abs(x) / fabs(x) -> |x| in one pass, unclosed calls are left as they are
+    out = []
+    opened = []
+    indx, length = 0, len(string)
+    while indx < length:
+        if string.startswith('abs(', indx) or string.startswith('fabs(', indx):
+            call = 'abs(' if string[indx] == 'a' else 'fabs('
+            opened.append((len(out), call))
+            out.append('|')
+            indx += len(call)
+            continue
+        char = string[indx]
+        if char == '(':
+            opened.append(None)
+        elif char == ')' and opened and opened.pop() is not None:
+            char = '|'
+        out.append(char)
+        indx += 1
+    for call in opened:
+        if call is not None:
+            out[call[0]] = call[1]
+    return ''.join(out)
+
+def is_operand_end(char):
+    return is_word_char(char) or char in ')|]'
+
+def is_operand_start(char):
+    return is_word_char(char) or char in '(|√['
+
+def operator_at(string, indx):
+    pair = string[indx:indx + 2]
+    if pair in ('&&', '||') or pair[:1] in OPERATOR_CHARS and pair[1:] == '=':
+        return pair
+    if pair[:1] in OPERATOR_CHARS:
+        return pair[:1]
+    return ''
+
+def collapse_operator_spaces(string):
+    # a + b -> a+b around arithmetic, comparison and logical operators, in one pass
+    out = []
+    indx, length = 0, len(string)
+    while indx < length:
+        char = string[indx]
+        if char.isspace() and indx and is_operand_end(string[indx - 1]):
+            operator = operator_at(string, indx + 1)
+            after = indx + 1 + len(operator)
+            if operator and after + 1 < length and string[after].isspace() and is_operand_start(string[after + 1]):
+                out.append(operator)
+                indx = after + 1
+                continue
+        out.append(char)
+        indx += 1
+    return ''.join(out)
+
+
+def strip_semicolon(string):
+    return (string[:-1] if string[-1:] == ';' else string).rstrip()
+
+
+def replace_sqrt(string):
+    return SQRT_NUMBER.sub(r'√\1', string).replace('sqrt', '√')
+
+
+def drop_float_dots(string):
+    return FLOAT_LEADING_DOT.sub(r'\g<1>0.\2', FLOAT_TRAILING_DOT.sub(r'\1\2', string))
+
+
+def fold_powers(string):
+    # x*x*x -> x^3, longest products first
+    for pattern in POWER_PATTERNS:
+        found = pattern.search(string)
+        if found:
+            string = string.replace(found[0], f'{found[1]}^{found[0].count("*") + 1}')
+    return string
+
+
+class Deref:
+    # open *( of a dereference; the base (name with optional [..] indexes) is checked while it is read
+    __slots__ = ('start', 'plus', 'brackets', 'named', 'indexed', 'valid')
+
+    def __init__(self, start):
+        self.start = start
+        self.plus = None
+        self.brackets = 0
+        self.named = self.indexed = False
+        self.valid = True
+
+    def read(self, char, out):
+        if self.plus is not None or not self.valid:
+            return
+        if self.brackets:
+            self.brackets += (char == '[') - (char == ']')
+        elif char == '+' and self.named:
+            self.plus = len(out)
+        elif char == '[' and self.named:
+            self.brackets = 1
+            self.indexed = True
+        elif is_word_char(char) and not self.indexed:
+            self.named = True
+        else:
+            self.valid = False
+
+    def read_child(self, converted):
+        # a nested *(a+i) that became a[i] is a valid base, any other scope is not
+        if self.plus is not None or not self.valid or self.brackets:
+            return
+        if converted and not self.named:
+            self.named = self.indexed = True
+        else:
+            self.valid = False
+
+
+def pointers_to_indexes(string):
+    # *(a + i) -> a[i] in one pass, nested dereferences included; products like x*(a + i) are kept
+    out = []
+    opened = []
+    indx, length = 0, len(string)
+    while indx < length:
+        char = string[indx]
+        parent = opened[-1] if opened else None
+        if string.startswith('*(', indx) and not (indx and is_operand_end(string[indx - 1])):
+            opened.append(Deref(len(out)))
+            out.append('*(')
+            indx += 2
+            continue
+        if char == '(':
+            opened.append(None)
+        elif char == ')' and opened:
+            scope = opened.pop()
+            converted = scope is not None and scope.valid and scope.plus is not None and scope.plus < len(out) - 1
+            if converted:
+                out[scope.start] = ''
+                out[scope.plus] = '['
+                char = ']'
+            if opened and opened[-1] is not None:
+                opened[-1].read_child(converted)
+        elif parent is not None:
+            parent.read(char, out)
+        out.append(char)
+        indx += 1
+    return ''.join(out)
+
+
+def indent_to_depth(string):
+    spaces = LEADING_SPACES.match(string)[0]
+    return str(len(spaces)) + string[len(spaces):]
+
+
+def strip_declared_names(string):
+    return DECLARED_NAMES.sub(r'\1', string).rstrip()
+
+
+def is_not_prototype_call(line, next_line):
+    return not (PROTOTYPE_CALL.match(line) and not BLOCK_OPEN.match(next_line))
+
+
+SQRT_NUMBER = re.compile(r'sqrt\((-?\d+(?:\.\d+)?)\)')
+FLOAT_TRAILING_DOT = re.compile(r'(\d)\.(\D|$)')
+FLOAT_LEADING_DOT = re.compile(r'(\D)\.(\d)')
+POWER_PATTERNS = [re.compile(fr'([a-zA-Z]\w*)(?:\*\1){{{j},}}') for j in range(10, 0, -1)]
+OPERATOR_CHARS = '/*+-=<>'
+LEADING_SPACES = re.compile(r'\s*')
+PROTOTYPE_CALL = re.compile(r'\w+\(.+\)$')
+BLOCK_OPEN = re.compile(r'\s*\{')
+DECLARED_NAMES = re.compile(r'(\d)(?:\w+, )+')
+
+BASE_TYPES = ('int', 'double', 'float', 'bool', 'string', 'void', 'const')
+TYPE_LINK = r'(?: [*&]+| |[*&]+ )'
+WORD = re.compile(r'\w+')
+TYPED_WORD = re.compile(fr'(\w+){TYPE_LINK}')
+LOOSE_TYPED_WORD = re.compile(r'(\w+)( ?)')
+DECLARATION = re.compile(fr'\s*(\w+){TYPE_LINK}\w+((?:,\s(?:\w+{TYPE_LINK})?\w+)*)$')
+DECLARATION_ITEM = re.compile(fr',\s(?:(\w+){TYPE_LINK})?\w+')
+LOOSE_DECLARATION = re.compile(r'\s*(\w+)(?: (\w+))?((?:,\s\w+(?: \w+)?)*)$')
+LOOSE_DECLARATION_ITEM = re.compile(r',\s(\w+)(?: (\w+))?')
+pattern_for_func = r'(\w*[a-z0-9_]+\w*)(\s\w*[a-z0-9_]+\w*)*'
+
+
+def cleanup_rules():
+    return [
+        BlockComments('block comments'),
+        Sub('line comments', r'\s*//.*', ''),
+        Apply('semicolons', strip_semicolon),
+    ]
+
+def expression_rules():
+    return [
+        Drop('blank lines', r'\s*', full=True),
+        Drop('header lines', r'[а-яА-Я]|#include|using|typedef|\s*setlocale'), # clearing first strings of code
+        Lookahead('prototype calls', is_not_prototype_call),
+        Sub('do-while', '} while', 'while'),
+        Sub('block openers', r'((?:for|if|while|switch|case|[0-9a-zA-Z_]+\().*)(?::|\{)', r'\1'),
+        Sub('for separators', r'; (\w)', r';\1'),
+        Apply('statement scopes', replace_1st_scope_pair, guard=r'((?:for|if|while|switch|case) )\((.*)\)'),
+        Apply('sqrt', replace_sqrt),
+        Apply('abs', replace_abs, guard=r'f?abs\(.*?\)'),
+        Apply('float dots', drop_float_dots),
+        Apply('operator spaces', collapse_operator_spaces),
+        Sub('implicit number muls', r'(?<=\W)(\d+)\*([a-zA-Z](?!\d)|√|\()', r'\1\2'),
+        Sub('implicit scope muls', r'(\))\*(\()', r'\1\2'),
+        Apply('powers', fold_powers),
+        Apply('pointer indexes', pointers_to_indexes),
+        Drop('punctuation lines', r'\W*', full=True),
+        Sub('indent width', r' {4}', ' '),
+        Apply('indent depth', indent_to_depth),
+        Apply('operator spaces after indent', collapse_operator_spaces),
+        Sub('trailing args', r'(?:, \w+)+$', ''),
+    ]
+
+
+def read_trailer(endline):
+    # the last line of a lab file names the functions to draw, PTR at its end keeps pointer/reference marks
+    match = re.match(pattern_for_func, endline)
+    func_mother = match[0].split() if match else ['what?']
+    save_pointer = bool(re.search(r'PTR$', endline))
+    return func_mother, save_pointer
+
+
+def after_typedef(string, pos):
+    return pos >= 8 and string.startswith('typedef', pos - 8) and string[pos - 1].isspace()
+
+
+class TypeNames:
+    """Base types and typedef names, looked up by name instead of one alternation regex over all of them.
+    It keeps that regex's matches, which tests/test_simplify.py checks: a type may end a longer word,
+    and with PTR start anywhere inside one."""
+
+    def __init__(self, names=(), save_pointer=False):
+        self.save_pointer = save_pointer
+        self.order = {}
+        self.lengths = []
+        self.initials = set()
+        for name in BASE_TYPES + tuple(names):
+            self.add(name)
+
+    def __contains__(self, name):
+        return name in self.order
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def add(self, name):
+        if name in self.order or not WORD.fullmatch(name):
+            return
+        self.order[name] = len(self.order)
+        self.initials.add(name[0])
+        self.lengths = sorted({len(name) for name in self.order}, reverse=True)
+
+    def strip(self, line):
+        # drops every type with the pointer marks and space after it
+        if self.save_pointer:
+            return LOOSE_TYPED_WORD.sub(self._strip_loose, line)
+        return TYPED_WORD.sub(self._strip_typed, line)
+
+    def _strip_typed(self, match):
+        # the shortest suffix of the word that is a type, the word itself only when no typedef comes before it
+        word = match[1]
+        for length in self.lengths:
+            if length <= len(word) and word[-length:] in self.order:
+                if length < len(word) or not after_typedef(match.string, match.start()):
+                    return word[:-length]
+        return match[0]
+
+    def _strip_loose(self, match):
+        # every type inside the word goes, the first one in order winning at a position; a space after the last goes too
+        word, space = match[1], match[2]
+        kept = []
+        pos = 0
+        while pos < len(word):
+            found = None
+            if word[pos] in self.initials and (pos or not after_typedef(match.string, match.start())):
+                found = min(
+                    (word[pos:pos + length] for length in self.lengths if word[pos:pos + length] in self.order),
+                    key=self.order.__getitem__, default=None,
+                )
+            if found is None:
+                kept.append(word[pos])
+                pos += 1
+            else:
+                pos += len(found)
+                if pos == len(word):
+                    space = ''
+        return ''.join(kept) + space
+
+    def is_declaration(self, line):
+        # `type name, name` or `type name, type name` and nothing else on the line
+        if self.save_pointer:
+            match = LOOSE_DECLARATION.match(line)
+            if match is None:
+                return False
+            first, second = match[1], match[2]
+            if second is None:
+                if not any(first[:length] in self.order for length in self.lengths if length < len(first)):
+                    return False
+            elif first not in self.order:
+                return False
+            return all(item[2] is None or item[1] in self.order for item in LOOSE_DECLARATION_ITEM.finditer(match[3]))
+        match = DECLARATION.match(line)
+        if match is None or match[1] not in self.order:
+            return False
+        return all(item[1] is None or item[1] in self.order for item in DECLARATION_ITEM.finditer(match[2]))
+
+
+class Simplifier:
+    """Streams source lines through the rules, keeping only typedefs, the PTR flag and the wanted function names.
+    Typedef names come from the symbol table when given, otherwise they are picked up from typedef lines as they pass."""
+
+    def __init__(self, func_mother=(), save_pointer=False, profile=False, typedefs=None):
+        self.func_mother = list(func_mother)
+        self.save_pointer = save_pointer
+        self.types = TypeNames(typedefs or (), save_pointer)
+        self.mentioned = set()
+        self._last_mentioned = set()
+
+        rules = cleanup_rules()
+        if typedefs is None:
+            rules.append(Apply('typedefs', self._track_typedef))
+        rules += [
+            Apply('declarations', self._drop_declaration),
+            Apply('type names', self.types.strip),
+        ]
+        if save_pointer:
+            rules.append(Sub('pointer params', r', (\*|&) (\w+)', r', \1\2'))
+        rules += expression_rules()
+        rules += [Apply('function mentions', self._track_mentions), Apply('declared names', strip_declared_names)]
+        self.pipeline = Pipeline(rules, profile)
+
+    @property
+    def typedefs(self):
+        return list(self.types)[len(BASE_TYPES):]
+
+    def _track_typedef(self, line):
+        if line.startswith('typedef'):
+            self.types.add(re.sub(r'\[.*\]', '', line.split()[-1]))
+        return line
+
+    def _drop_declaration(self, line):
+        return '' if self.types.is_declaration(line) else line
+
+    def _track_mentions(self, line):
+        # names seen on every line but the last one decide whether functions get picked out at all
+        self.mentioned |= self._last_mentioned
+        self._last_mentioned = {func for func in self.func_mother if func in line}
+        return line
+
+    def iter_rules(self):
+        return self.pipeline.iter_rules()
+
+    def iter_simplified(self, lines):
+        return self.pipeline.run(line.rstrip('\n') for line in lines)
+
+    def select_functions(self, lines):
+        wanted = [func for func in self.func_mother if func in self.mentioned]
+        if not wanted:
+            return lines
+        return FunctionIndex(lines, self.types).extract(wanted)
+
+
+class FunctionIndex:
+    """Depth-0 blocks of simplified lines, found in one pass; a block runs up to the next depth-0 line.
+    A name picks every block whose header, with or without its leading type, starts with it."""
+
+    def __init__(self, lines, types=None):
+        self.lines = lines
+        types = types if types is not None else TypeNames()
+        # the last line never opens a block, a block without a following header takes the rest
+        starts = [indx for indx, line in enumerate(lines[:-1]) if line[:1] == '0']
+        self.spans = list(zip(starts, starts[1:] + [len(lines)]))
+
+        headers = []
+        for span in self.spans:
+            header = lines[span[0]][1:]
+            headers.append((header, span))
+            head, space, rest = header.partition(' ')
+            if space and head in types:
+                headers.append((rest, span))
+        headers.sort()
+        self._headers = [header for header, _ in headers]
+        self._header_spans = [span for _, span in headers]
+
+    def __len__(self):
+        return len(self.spans)
+
+    def names(self):
+        # the leading word of every block header, in line order
+        return [match[0] for start, _ in self.spans if (match := WORD.match(self.lines[start], 1))]
+
+    def find(self, func):
+        # (start, end) line spans in line order; sorted headers make it a prefix range lookup
+        found = set()
+        indx = bisect_left(self._headers, func)
+        while indx < len(self._headers) and self._headers[indx].startswith(func):
+            found.add(self._header_spans[indx])
+            indx += 1
+        return sorted(found)
+
+    def function(self, func):
+        return [line for start, end in self.find(func) for line in self.lines[start:end]]
+
+    def extract(self, funcs):
+        # lines of the wanted functions, function by function in the order asked
+        return [line for func in funcs for line in self.function(func)]
+
+
+def iter_simplified(lines, func_mother=(), save_pointer=False, typedefs=None):
+    return Simplifier(func_mother, save_pointer, typedefs=typedefs).iter_simplified(lines)
+
+
+def simplify_source(text):
+    from parser.symbols import build_symbols
+
+    lines = text.split('\n')
+    if len(lines) > 1 and lines[-1] == '':
+        lines.pop()
+    func_mother, save_pointer = read_trailer(lines[-1])
+    with tracing.span('simplify_source', lines=len(lines)):
+        # the typedefs come from the syntax tree, so no line has to be matched against a growing list of them
+        symbols = build_symbols('\n'.join(lines[:-1]))
+        # per-rule times are only collected while tracing, they cost a clock call per rule and line
+        simplifier = Simplifier(func_mother, save_pointer, tracing.active() is not None, symbols.type_names())
+        started = tracing.now()
+        with tracing.span('simplify'):
+            simplified = list(simplifier.iter_simplified(lines[:-1]))
+        tracing.rule_spans(simplifier.iter_rules(), started)
+        tracing.count('regex substitutions', sum(rule.hits for rule in simplifier.pipeline.rules if isinstance(rule, Sub)))
+        with tracing.span('select_functions'):
+            return simplifier.select_functions(simplified)
@@ -0,0 +1,93 @@
+from typing import NamedTuple
+
+import tracing
+from parser.parser import language, parse
+
+
+SYMBOLS_QUERY = '''
+(type_definition declarator: (_) @name) @typedef
+(function_definition declarator: (_) @name) @function
+(declaration declarator: (_) @name) @declaration
+'''
+NAME_TYPES = ('identifier', 'type_identifier', 'field_identifier', 'qualified_identifier', 'operator_name', 'destructor_name')
+
+_query = None
+
+
+def symbols_query():
+    global _query
+    if _query is None:
+        from tree_sitter import Query
+
+        _query = Query(language(), SYMBOLS_QUERY)
+    return _query
+
+
+def declarator_name(node):
+    # the name inside a declarator: `* strin`, `arr[3]`, `(*fn)(int)`, `*g(int a)` and `x = 0` give strin, arr, fn, g, x
+    while node is not None and node.type not in NAME_TYPES:
+        inner = node.child_by_field_name('declarator')
+        if inner is None:
+            inner = next((child for child in node.named_children if child.type != 'parameter_list'), None)
+        node = inner
+    return node.text.decode('utf8') if node is not None else None
+
+
+class Symbol(NamedTuple):
+    name: str
+    kind: str
+    start_byte: int
+    end_byte: int
+    start_line: int
+    end_line: int
+
+
+class SymbolTable:
+    """Typedefs, declarations and function definitions of a source with their byte and line ranges, found in one query pass"""
+
+    def __init__(self, symbols=()):
+        self.symbols = list(symbols)
+        self.by_name = {}
+        for symbol in self.symbols:
+            self.by_name.setdefault(symbol.name, []).append(symbol)
+
+    @classmethod
+    def from_tree(cls, tree):
+        from tree_sitter import QueryCursor
+
+        symbols = []
+        for _, captures in QueryCursor(symbols_query()).matches(tree.root_node):
+            kind, (node,) = next((kind, nodes) for kind, nodes in captures.items() if kind != 'name')
+            for declarator in captures['name']:
+                name = declarator_name(declarator)
+                if name is None:
+                    continue
+                prototype = kind == 'declaration' and declarator.type == 'function_declarator'
+                symbols.append(Symbol(
+                    name, 'prototype' if prototype else kind,
+                    node.start_byte, node.end_byte, node.start_point[0], node.end_point[0],
+                ))
+        return cls(symbols)
+
+    def of_kind(self, kind):
+        return [symbol for symbol in self.symbols if symbol.kind == kind]
+
+    def type_names(self):
+        # typedef names in source order, the order the simplifier tries them in
+        return list(dict.fromkeys(symbol.name for symbol in self.symbols if symbol.kind == 'typedef'))
+
+    def functions(self, name=None):
+        if name is None:
+            return self.of_kind('function')
+        return [symbol for symbol in self.by_name.get(name, ()) if symbol.kind == 'function']
+
+    def defines(self, name):
+        return bool(self.functions(name))
+
+
+def build_symbols(source):
+    if isinstance(source, str):
+        source = source.encode('utf8')
+    tree = parse(source)
+    with tracing.span('symbols'):
+        return SymbolTable.from_tree(tree)
@@ -0,0 +1,305 @@
+import argparse
+import json
+import math
+import os
+import struct
+import time
+import traceback
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from drow import FlowchartRenderer
+
+# Растровый шрифт 5x7: пять столбцов по байту, младший бит - верхняя строка
+GLYPHS = {
+    " ": "0000000000", "!": "00005F0000", '"': "0007000700", "#": "147F147F14", "$": "242A7F2A12",
+    "%": "2313086462", "&": "3649562050", "'": "0005030000", "(": "001C224100", ")": "0041221C00",
+    "*": "2A1C7F1C2A", "+": "08083E0808", ",": "0050300000", "-": "0808080808", ".": "0060600000",
+    "/": "2010080402", "0": "3E5149453E", "1": "00427F4000", "2": "4261514946", "3": "2141454B31",
+    "4": "1814127F10", "5": "2745454539", "6": "3C4A494930", "7": "0171090503", "8": "3649494936",
+    "9": "064949291E", ":": "0036360000", ";": "0056360000", "<": "0814224100", "=": "1414141414",
+    ">": "0041221408", "?": "0201510906", "@": "324979413E", "A": "7E1111117E", "B": "7F49494936",
+    "C": "3E41414122", "D": "7F4141221C", "E": "7F49494941", "F": "7F09090901", "G": "3E4149497A",
+    "H": "7F0808087F", "I": "00417F4100", "J": "2040413F01", "K": "7F08142241", "L": "7F40404040",
+    "M": "7F020C027F", "N": "7F0408107F", "O": "3E4141413E", "P": "7F09090906", "Q": "3E4151215E",
+    "R": "7F09192946", "S": "4649494931", "T": "01017F0101", "U": "3F4040403F", "V": "1F2040201F",
+    "W": "3F4038403F", "X": "6314081463", "Y": "0708700807", "Z": "6151494543", "[": "007F414100",
+    "\\": "0204081020", "]": "0041417F00", "^": "0402010204", "_": "4040404040", "`": "0001020400",
+    "a": "2054545478", "b": "7F48444438", "c": "3844444420", "d": "384444487F", "e": "3854545418",
+    "f": "087E090102", "g": "0C5252523E", "h": "7F08040478", "i": "00447D4000", "j": "2040443D00",
+    "k": "7F10284400", "l": "00417F4000", "m": "7C04180478", "n": "7C08040478", "o": "3844444438",
+    "p": "7C14141408", "q": "081414187C", "r": "7C08040408", "s": "4854545420", "t": "043F444020",
+    "u": "3C4040207C", "v": "1C2040201C", "w": "3C4030403C", "x": "4428102844", "y": "0C5050503C",
+    "z": "4464544C44", "{": "0008364100", "|": "00007F0000", "}": "0041360800", "~": "0804081008",
+    "Б": "7F49494931", "Г": "7F01010101", "Д": "603F213F60", "Ж": "63147F1463", "З": "2241494936",
+    "И": "7F1008047F", "Й": "7E1109057E", "Л": "403E01017F", "П": "7F0101017F", "У": "274848483F",
+    "Ф": "0C127F120C", "Ц": "3F20203F60", "Ч": "070808087F", "Ш": "7F407F407F", "Щ": "3F203F207F",
+    "Ъ": "017F484830", "Ы": "7F4878007F", "Ь": "7F48484830", "Э": "224149493E", "Ю": "7F083E413E",
+    "Я": "462919097F", "Ё": "7E4B4A4B42", "б": "3C4A494931", "в": "7C54545428", "г": "7C04040404",
+    "д": "603C243C60", "ж": "44287C2844", "з": "4454545428", "и": "7C2010087C", "й": "7C22120A7C",
+    "к": "7C10284400", "л": "403804047C", "м": "7C0810087C", "н": "7C1010107C", "п": "7C0404047C",
+    "т": "04047C0404", "ф": "18247F2418", "ц": "3C20203C60", "ч": "0C1010107C", "ш": "7C407C407C",
+    "щ": "3C203C207C", "ъ": "047C505020", "ы": "7C5070007C", "ь": "7C50505020", "э": "2844545438",
+    "ю": "7C10384438", "я": "483414147C", "ё": "3856545618",
+}
+# Кириллица, совпадающая по начертанию с латиницей
+GLYPHS.update({cyrillic: GLYPHS[latin] for cyrillic, latin in zip("АВЕКМНОРСТХаеорсух", "ABEKMHOPCTXaeopcyx")})
+MISSING_GLYPH = "7F4141417F"
+GLYPH_ADVANCE = 6
+
+
+@lru_cache(maxsize=None)
+def glyph_columns(char):
+    code = GLYPHS.get(char, MISSING_GLYPH)
+    return tuple(int(code[i:i + 2], 16) for i in range(0, 10, 2))
+
+
+def parse_color(value):
+    """'#e6f3ff' или '#333' -> три байта RGB"""
+    value = value.lstrip("#")
+    if len(value) == 3:
+        value = "".join(digit * 2 for digit in value)
+    return bytes.fromhex(value)
+
+
+class Canvas:
+    """RGB-растр в одном bytearray, всё рисуется горизонтальными отрезками"""
+
+    def __init__(self, width, height, background="#ffffff"):
+        self.width = width
+        self.height = height
+        self.pixels = bytearray(parse_color(background) * (width * height))
+
+    def fill_span(self, y, left, right, color):
+        """Закрашивает пиксели строки y от left до right (не включая)"""
+        if not 0 <= y < self.height:
+            return
+        left, right = max(left, 0), min(right, self.width)
+        if left < right:
+            start = (y * self.width + left) * 3
+            self.pixels[start:start + (right - left) * 3] = color * (right - left)
+
+    def fill_rect(self, left, top, right, bottom, color):
+        left, right = round(left), round(right)
+        for y in range(max(round(top), 0), min(round(bottom), self.height)):
+            self.fill_span(y, left, right, color)
+
+    def fill_ellipse(self, cx, cy, rx, ry, color):
+        if rx <= 0 or ry <= 0:
+            return
+        for y in range(max(math.floor(cy - ry), 0), min(math.ceil(cy + ry), self.height)):
+            dy = (y + 0.5 - cy) / ry
+            if abs(dy) < 1:
+                half = rx * math.sqrt(1 - dy * dy)
+                self.fill_span(y, round(cx - half), round(cx + half), color)
+
+    def fill_polygon(self, points, color):
+        """Заливка многоугольника по правилу чётности, пересечения берутся в центрах строк"""
+        ys = [y for _, y in points]
+        edges = list(zip(points, points[1:] + points[:1]))
+        for y in range(max(math.floor(min(ys)), 0), min(math.ceil(max(ys)), self.height)):
+            center = y + 0.5
+            crossings = sorted(
+                x0 + (center - y0) * (x1 - x0) / (y1 - y0)
+                for (x0, y0), (x1, y1) in edges
+                if y0 <= center < y1 or y1 <= center < y0
+            )
+            for left, right in zip(crossings[::2], crossings[1::2]):
+                self.fill_span(y, round(left), round(right), color)
+
+    def draw_text(self, x, baseline, text, color, pixel=1):
+        """Строка растровым шрифтом, x - середина строки, baseline - нижний край букв"""
+        width = (len(text) * GLYPH_ADVANCE - 1) * pixel
+        left = round(x - width / 2)
+        top = round(baseline) - 7 * pixel
+        for index, char in enumerate(text):
+            for column, bits in enumerate(glyph_columns(char)):
+                column_left = left + (index * GLYPH_ADVANCE + column) * pixel
+                row = 0
+                while bits:
+                    if bits & 1:
+                        self.fill_rect(column_left, top + row * pixel, column_left + pixel, top + (row + 1) * pixel, color)
+                    bits >>= 1
+                    row += 1
+
+    def write_png(self, fp, level=6):
+        """PNG RGB 8 бит, строки сжимаются zlib по мере записи"""
+        def chunk(kind, data):
+            return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+        compressor = zlib.compressobj(level)
+        stride = self.width * 3
+        data = []
+        for y in range(self.height):
+            data.append(compressor.compress(b"\x00" + self.pixels[y * stride:(y + 1) * stride]))
+        data.append(compressor.flush())
+
+        fp.write(b"\x89PNG\r\n\x1a\n")
+        fp.write(chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)))
+        fp.write(chunk(b"IDAT", b"".join(data)))
+        fp.write(chunk(b"IEND", b""))
+
+
+class PngRenderer(FlowchartRenderer):
+    """Те же укладка и линии, что у FlowchartRenderer, но примитивы рисуются в растр, а не в SVG"""
+
+    colors = {
+        "block": ("#000000", "#ffffff"),
+        "decision": ("#0066cc", "#e6f3ff"),
+        "startend": ("#333333", "#f0f0f0"),
+        "text": "#333333",
+        "line": "#000000",
+    }
+
+    def __init__(self, json_data, scale=2):
+        super().__init__(json_data)
+        self.scale = scale
+        self.stroke_width = 2
+        self.canvas = None
+
+    def render_png(self, fp, relayout=True):
+        """Пишет блок-схему в PNG, scale - пикселей на единицу SVG"""
+        if relayout or self.routes is None:
+            self.layout()
+        width, height = self.size()
+        self.canvas = Canvas(int(width * self.scale), int(height * self.scale))
+
+        for points in self.routes:
+            self._draw_connection(points)
+        for i in range(len(self.blocks)):
+            self._draw_block(i)
+
+        self.canvas.write_png(fp)
+
+    def _color(self, name):
+        return parse_color(self.colors[name])
+
+    def _draw_text(self, x, text_y, text_lines):
+        s = self.scale
+        for i, line in enumerate(text_lines):
+            self.canvas.draw_text(x * s, (text_y + i*15) * s, line, self._color("text"), s)
+
+    def _draw_rectangle(self, i):
+        blocks = self.blocks
+        s, half = self.scale, self.stroke_width / 2
+        left, top = blocks.x[i] - blocks.width[i]/2, blocks.y[i]
+        right, bottom = left + blocks.width[i], top + blocks.height[i]
+        stroke, fill = (parse_color(color) for color in self.colors["block"])
+
+        # Обводка по центру границы: полоса наружу и внутрь
+        self.canvas.fill_rect((left - half) * s, (top - half) * s, (right + half) * s, (bottom + half) * s, stroke)
+        self.canvas.fill_rect((left + half) * s, (top + half) * s, (right - half) * s, (bottom - half) * s, fill)
+        self._draw_text(blocks.x[i], top + 20, blocks.texts[i].lines)
+
+    def _draw_ellipse(self, i):
+        blocks = self.blocks
+        s, half = self.scale, self.stroke_width / 2
+        rx, ry = blocks.width[i] / 2, blocks.height[i] / 3
+        cx, cy = blocks.x[i], blocks.y[i] + ry
+        stroke, fill = (parse_color(color) for color in self.colors["startend"])
+
+        self.canvas.fill_ellipse(cx * s, cy * s, (rx + half) * s, (ry + half) * s, stroke)
+        self.canvas.fill_ellipse(cx * s, cy * s, (rx - half) * s, (ry - half) * s, fill)
+        self._draw_text(cx, cy, blocks.texts[i].lines)
+
+    def _draw_diamond(self, i):
+        blocks = self.blocks
+        s, half = self.scale, self.stroke_width / 2
+        cx, cy = blocks.x[i], blocks.y[i] + blocks.height[i]/2
+        a, b = blocks.width[i] / 2, blocks.height[i] / 2
+        stroke, fill = (parse_color(color) for color in self.colors["decision"])
+
+        # Сдвиг сторон ромба на half по нормали меняет полудиагонали пропорционально
+        side = math.hypot(a, b)
+        for offset, color in ((half, stroke), (-half, fill)):
+            da, db = a + offset * side / b, b + offset * side / a
+            points = [(cx * s, (cy - db) * s), ((cx + da) * s, cy * s), (cx * s, (cy + db) * s), ((cx - da) * s, cy * s)]
+            self.canvas.fill_polygon(points, color)
+
+        if blocks.conditions[i]:
+            text_lines = blocks.texts[i].lines
+            self._draw_text(cx, cy - (len(text_lines)-1)*7.5, text_lines)
+
+    def _draw_connection(self, points):
+        s, half = self.scale, self.stroke_width / 2
+        color = self._color("line")
+        for (x0, y0), (x1, y1) in zip(points, points[1:]):
+            self.canvas.fill_rect(
+                (min(x0, x1) - half) * s, (min(y0, y1) - half) * s,
+                (max(x0, x1) + half) * s, (max(y0, y1) + half) * s,
+                color,
+            )
+
+        # Наконечник как у маркера SVG: 10x7 в толщинах линии, конец линии в точке refX=9
+        (x0, y0), (x1, y1) = points[-2], points[-1]
+        length = math.hypot(x1 - x0, y1 - y0) or 1
+        dx, dy = (x1 - x0) / length, (y1 - y0) / length
+        w = self.stroke_width
+        tip = (x1 + dx * w, y1 + dy * w)
+        base = (x1 - dx * 9 * w, y1 - dy * 9 * w)
+        wing = 3.5 * w
+        arrow = [tip, (base[0] - dy * wing, base[1] + dx * wing), (base[0] + dy * wing, base[1] - dx * wing)]
+        self.canvas.fill_polygon([(x * s, y * s) for x, y in arrow], color)
+
+
+def render_file(task):
+    # runs in a worker process, one flowchart per task
+    json_data, path, scale = task
+    record = {"function": json_data.get("function", {}).get("name", ""), "output": path, "seconds": None, "error": None}
+    started = time.perf_counter()
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            PngRenderer(json_data, scale).render_png(f)
+    except Exception as error:
+        record["error"] = f"{type(error).__name__}: {error}"
+        record["traceback"] = traceback.format_exc()
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+def render_pngs(charts, directory, jobs=None, scale=2):
+    """Каждая блок-схема рисуется в своём процессе в <directory>/<функция>.png"""
+    tasks = []
+    used = {}
+    for json_data in charts:
+        name = json_data.get("function", {}).get("name") or "flowchart"
+        # Перегрузки с одним именем получают номер
+        used[name] = used.get(name, 0) + 1
+        file_name = f"{name}.png" if used[name] == 1 else f"{name}_{used[name]}.png"
+        tasks.append((json_data, os.path.join(directory, file_name), scale))
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(tasks) < 2:
+        return [render_file(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(render_file, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description="Render flowcharts to PNG, one worker process per chart")
+    arguments.add_argument("source", help="flowchart JSON or a C++ source, one chart per function")
+    arguments.add_argument("-o", "--output", default="output/png", help="directory for PNG files")
+    arguments.add_argument("-j", "--jobs", type=int, default=None, help="worker processes, all cores by default")
+    arguments.add_argument("--scale", type=int, default=2, help="pixels per SVG unit")
+    args = arguments.parse_args(argv)
+
+    if args.source.endswith(".json"):
+        with open(args.source, encoding="utf-8") as f:
+            charts = [json.load(f)]
+    else:
+        from parser.flowchart import build_flowcharts
+
+        with open(args.source, "rb") as f:
+            charts = build_flowcharts(f.read())
+
+    started = time.perf_counter()
+    records = render_pngs(charts, args.output, args.jobs, args.scale)
+    failed = sum(record["error"] is not None for record in records)
+    print(f"{len(records)} charts, {failed} failed, {time.perf_counter() - started:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+
+STATUS = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    411: 'Length Required', 413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable',
+}
+KINDS = ('ast', 'simplified', 'svg')
+
+
+def warm_up():
+    # runs once per worker: the imports and the tree-sitter Language and Parser are built here, later requests reuse them
+    import drow  # noqa: F401
+    import parser.flowchart  # noqa: F401
+    import parser.simplify  # noqa: F401
+    from parser.parser import get_parser
+
+    get_parser()
+
+
+def render(kind, source, options):
+    if kind == 'ast':
+        from parser.parser import parserCPP
+
+        tree = parserCPP(
+            source,
+            named_only=options.get('named_only') == '1',
+            ranges=options.get('ranges') == '1',
+            compact=options.get('compact') == '1',
+            max_depth=int(options['max_depth']) if 'max_depth' in options else None,
+        )
+        return 200, 'application/json', json.dumps(tree, ensure_ascii=False).encode('utf8')
+
+    if kind == 'simplified':
+        from parser.simplify import simplify_source
+
+        lines = simplify_source(source.decode('utf8'))
+        return 200, 'text/plain; charset=utf-8', ''.join(line + '\n' for line in lines).encode('utf8')
+
+    from drow import FlowchartRenderer
+    from parser.flowchart import build_flowcharts
+
+    name = options.get('function')
+    charts = build_flowcharts(source, [name] if name else None)
+    if not charts:
+        return 404, 'text/plain; charset=utf-8', b'no such function\n'
+    return 200, 'image/svg+xml', FlowchartRenderer(charts[0]).generate_svg().encode('utf8')
+
+
+def render_batch(tasks):
+    # one executor call per batch, so pickling and scheduling are paid per batch instead of per file
+    results = []
+    for kind, source, options in tasks:
+        try:
+            results.append(render(kind, source, options))
+        except Exception as error:
+            results.append((500, 'text/plain; charset=utf-8', f'{type(error).__name__}: {error}\n'.encode('utf8')))
+    return results
+
+
+class RenderServer:
+    """Localhost HTTP endpoint: POST /ast, /simplified or /svg with C++ source in the body, GET /stats"""
+
+    def __init__(self, jobs=None, batch_size=32, batch_window=0.005, queue_size=1024, max_body=4 * 1024 * 1024):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.max_body = max_body
+        self.queue = asyncio.Queue(queue_size)
+        # at most one batch per worker is in flight, the rest wait in the bounded queue
+        self.slots = asyncio.Semaphore(self.jobs)
+        self.executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=warm_up)
+        self.stats = {'requests': 0, 'rendered': 0, 'batches': 0, 'rejected': 0, 'started': time.time()}
+        self.batcher = None
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self.batcher = asyncio.create_task(self._batch_loop())
+        # the first batch should not pay for spawning and warming the workers
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(loop.run_in_executor(self.executor, warm_up) for _ in range(self.jobs)))
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self):
+        if self.batcher is not None:
+            self.batcher.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def submit(self, kind, source, options):
+        # a full queue answers 503 at once, so clients back off instead of piling up connections
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((kind, source, options, future))
+        except asyncio.QueueFull:
+            self.stats['rejected'] += 1
+            return 503, 'text/plain; charset=utf-8', b'queue is full, retry later\n'
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            asyncio.create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        try:
+            tasks = [(kind, source, options) for kind, source, options, _ in batch]
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, render_batch, tasks)
+        except Exception as error:
+            failure = (500, 'text/plain; charset=utf-8', f'{type(error).__name__}: {error}\n'.encode('utf8'))
+            results = [failure] * len(batch)
+        finally:
+            self.slots.release()
+        self.stats['batches'] += 1
+        self.stats['rendered'] += len(batch)
+        for (_, _, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                if isinstance(body, tuple):
+                    status, content_type, payload = body
+                else:
+                    status, content_type, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [
+                    f'HTTP/1.1 {status} {STATUS.get(status, "")}',
+                    f'Content-Type: {content_type}',
+                    f'Content-Length: {len(payload)}',
+                    f'Connection: {"keep-alive" if keep_alive else "close"}',
+                ]
+                if status == 503:
+                    head.append('Retry-After: 1')
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            return 'GET', '', {'connection': 'close'}, (400, 'text/plain', b'bad request line\n')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if method != 'POST':
+            return method, target, headers, b''
+        if 'content-length' not in headers:
+            return method, target, dict(headers, connection='close'), (411, 'text/plain', b'Content-Length is required\n')
+        length = headers['content-length']
+        if not (length.isascii() and length.isdigit()):
+            return method, target, dict(headers, connection='close'), (400, 'text/plain', b'bad Content-Length\n')
+        length = int(length)
+        if length > self.max_body:
+            return method, target, dict(headers, connection='close'), (413, 'text/plain', b'body is too large\n')
+        return method, target, headers, await reader.readexactly(length)
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        path = url.path.strip('/')
+        if path == 'stats' and method == 'GET':
+            stats = dict(self.stats, queued=self.queue.qsize(), jobs=self.jobs)
+            return 200, 'application/json', json.dumps(stats).encode('utf8')
+        if path not in KINDS:
+            return 404, 'text/plain', b'use /ast, /simplified, /svg or /stats\n'
+        if method != 'POST':
+            return 405, 'text/plain', b'POST the source in the body\n'
+        self.stats['requests'] += 1
+        options = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        max_depth = options.get('max_depth')
+        if max_depth is not None and not (max_depth.isascii() and max_depth.isdigit()):
+            return 400, 'text/plain', b'max_depth must be a whole number\n'
+        return await self.submit(path, body, options)
+
+
+async def serve(host, port, **options):
+    server = RenderServer(**options)
+    listener = await server.start(host, port)
+    print(f'listening on http://{host}:{port} with {server.jobs} workers')
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description='Serve AST JSON, simplified lines and SVG over HTTP on localhost')
+    arguments.add_argument('--host', default='127.0.0.1')
+    arguments.add_argument('--port', type=int, default=8765)
+    arguments.add_argument('-j', '--jobs', type=int, default=None, help='worker processes, all cores by default')
+    arguments.add_argument('--batch-size', type=int, default=32, help='most requests per worker call')
+    arguments.add_argument('--batch-window', type=float, default=0.005, help='seconds to wait for a batch to fill')
+    arguments.add_argument('--queue', type=int, default=1024, help='waiting requests before answering 503')
+    args = arguments.parse_args(argv)
+    try:
+        asyncio.run(serve(
+            args.host, args.port,
+            jobs=args.jobs, batch_size=args.batch_size, batch_window=args.batch_window, queue_size=args.queue,
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+
+from parser.binary import BinaryTree, parserCPP_to_binary
+from parser.parser import parse, walk_tree
+
+
+SOURCE = b'''typedef int num;
+
+int main()
+{
+    num a[3] = {1, 2, 3};
+    for (int i = 0; i < 3; i++)
+        a[i] = a[i] * 2; // doubled
+    return a[0];
+}
+'''
+
+
+def fields(node):
+    return node.type, node.is_named, node.start_byte, node.end_byte, node.text
+
+
+def binary_tree(source, **options):
+    fp = io.BytesIO()
+    parserCPP_to_binary(source, fp, **options)
+    return BinaryTree(fp.getvalue())
+
+
+def assert_same_walk(binary, node, named_only, max_depth):
+    walked = list(binary.walk())
+    expected = list(walk_tree(node, named_only, max_depth))
+    assert [(depth, fields(current)) for depth, current in walked] == \
+           [(depth, fields(current)) for depth, current in expected]
+    for (depth, current), (_, original) in zip(walked, expected):
+        children = [child for child in original.children if child.is_named or not named_only]
+        if max_depth is not None and depth >= max_depth:
+            children = []
+        assert [fields(child) for child in current.children] == [fields(child) for child in children]
+
+
+@pytest.mark.parametrize('named_only, max_depth', [(False, None), (True, None), (False, 2), (True, 3), (False, 0)])
+def test_walk_and_children_match_walk_tree(named_only, max_depth):
+    root = parse(SOURCE).root_node
+    with binary_tree(SOURCE, named_only=named_only, max_depth=max_depth) as tree:
+        assert len(tree) == len(list(walk_tree(root, named_only, max_depth)))
+        assert_same_walk(tree.root_node, root, named_only, max_depth)
+        # a walk from any node covers just its subtree
+        for (depth, current), (_, original) in zip(tree.root_node.walk(), walk_tree(root, named_only, max_depth)):
+            assert_same_walk(current, original, named_only, None if max_depth is None else max_depth - depth)
+
+
+def test_open_maps_the_written_file(tmp_path):
+    path = tmp_path / 'main.cast'
+    with open(path, 'wb') as fp:
+        parserCPP_to_binary(SOURCE, fp, named_only=True)
+    tree = BinaryTree.open(path)
+    try:
+        assert tree.named_only
+        assert_same_walk(tree.root_node, parse(SOURCE).root_node, True, None)
+        assert [node.text for node in tree.nodes_of_type('comment')] == [b'// doubled']
+    finally:
+        tree.close()
+    assert tree._mmap is None
+
+
+def test_empty_source():
+    with binary_tree(b'') as tree:
+        assert len(tree) == 1
+        assert_same_walk(tree.root_node, parse(b'').root_node, False, None)
+        assert tree.root_node.children == []
+        assert tree.root_node.text == b''
@@ -0,0 +1,34 @@
+from cache import ResultCache, cached_function_svgs
+from drow import FlowchartRenderer
+from parser.flowchart import build_flowcharts
+
+
+SOURCE = '''typedef int num;
+
+num twice(num x)
+{
+    return x * 2;
+}
+
+void count(int n)
+{
+    for (int i = 0; i < n; i++)
+        print(i);
+}
+'''
+
+
+def test_function_svgs_are_drawn_again_only_for_the_edited_function(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    svgs = cached_function_svgs(cache, SOURCE)
+    assert svgs == {chart['function']['name']: FlowchartRenderer(chart).generate_svg() for chart in build_flowcharts(SOURCE)}
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    edited = SOURCE.replace('x * 2', 'x * 3')
+    svgs = cached_function_svgs(cache, edited)
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert svgs['twice'] == FlowchartRenderer(build_flowcharts(edited, ['twice'])[0]).generate_svg()
+
+    # a new typedef prelude is a new key for every function
+    cached_function_svgs(cache, 'typedef long big;\n' + edited, ['count'])
+    assert (cache.hits, cache.misses) == (1, 4)
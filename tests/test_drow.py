@@ -0,0 +1,87 @@
+import copy
+
+import pytest
+
+from drow import FlowchartRenderer
+from parser.flowchart import build_flowcharts
+
+
+SOURCE = '''
+int f(int *a, int n)
+{
+    int s = 0;
+    for (int i = 0; i < n; i++) {
+        if (a[i] > 0)
+            s += a[i];
+        else
+            s -= 1;
+    }
+    while (s > 100)
+        s /= 2;
+    return s;
+}
+'''
+
+
+def chart():
+    (built,) = build_flowcharts(SOURCE)
+    return built
+
+
+def block_by_label(flowchart, label):
+    (block_id,) = [block_id for block_id, block in flowchart.items() if block.get('label', block.get('condition')) == label]
+    return block_id
+
+
+def apply_patch(fragments, size, patch):
+    for op in patch:
+        if op['op'] == 'remove':
+            del fragments[op['id']]
+        elif op['op'] == 'size':
+            size = (op['width'], op['height'])
+        else:
+            assert (op['op'] == 'add') == (op['id'] not in fragments)
+            fragments[op['id']] = op['svg']
+    return size
+
+
+def relabel(flowchart):
+    flowchart[block_by_label(flowchart, 's = 0')]['label'] = 'сумма положительных элементов массива, иначе минус один'
+
+
+def add(flowchart):
+    before = block_by_label(flowchart, 's /= 2')
+    flowchart['log'] = {'type': 'output', 'label': 's', 'next': flowchart[before]['next']}
+    flowchart[before]['next'] = 'log'
+
+
+def remove(flowchart):
+    block_id = block_by_label(flowchart, 's -= 1')
+    target = flowchart.pop(block_id)['next']
+    for block in flowchart.values():
+        for port in ('next', 'true', 'false'):
+            if block.get(port) == block_id:
+                block[port] = target
+
+
+def relink(flowchart):
+    flowchart[block_by_label(flowchart, 's > 100')]['false'] = block_by_label(flowchart, 'i = 0')
+
+
+@pytest.mark.parametrize('edits', [[relabel], [add], [remove], [relink], [relabel, add, remove, relink]])
+def test_patched_render_equals_a_fresh_render(edits):
+    data = chart()
+    renderer = FlowchartRenderer(data)
+    ''.join(renderer.iter_svg(ids=True))
+    fragments, size = dict(renderer.fragments), renderer.svg_size
+    flowchart = data['flowchart']
+    for edit in edits:
+        flowchart = copy.deepcopy(flowchart)
+        edit(flowchart)
+        size = apply_patch(fragments, size, renderer.update(flowchart))
+
+        fresh = FlowchartRenderer(dict(data, flowchart=flowchart))
+        want = ''.join(fresh.iter_svg(ids=True))
+        assert ''.join(renderer.iter_svg(relayout=False, ids=True)) == want
+        assert fragments == fresh.fragments
+        assert size == fresh.svg_size
@@ -0,0 +1,105 @@
+from parser.flowchart import build_flowcharts
+
+
+def flowchart(body):
+    (chart,) = build_flowcharts(f'void f(int x)\n{{\n{body}\n}}\n')
+    return chart['flowchart']
+
+
+def block_by_label(blocks, label):
+    (block_id,) = [block_id for block_id, block in blocks.items() if block.get('label', block.get('condition')) == label]
+    return block_id
+
+
+def reachable(blocks):
+    seen = set()
+    pending = ['start']
+    while pending:
+        block_id = pending.pop()
+        if block_id in seen:
+            continue
+        seen.add(block_id)
+        pending += [blocks[block_id][port] for port in ('next', 'true', 'false') if port in blocks[block_id]]
+    return seen
+
+
+def test_default_first_falls_into_next_case():
+    blocks = flowchart('switch (x) { default: a(); case 1: b(); break; }')
+    decision = block_by_label(blocks, 'x == 1')
+    a, b = block_by_label(blocks, 'a()'), block_by_label(blocks, 'b()')
+    assert blocks[decision] == {'type': 'decision', 'condition': 'x == 1', 'true': b, 'false': a}
+    assert blocks[a]['next'] == b
+    assert blocks[b]['next'] == 'end'
+    assert reachable(blocks) == set(blocks)
+
+
+def test_default_in_the_middle():
+    blocks = flowchart('switch (x) { case 1: a(); default: b(); case 2: c(); break; case 3: d(); }')
+    a, b, c, d = (block_by_label(blocks, label) for label in ('a()', 'b()', 'c()', 'd()'))
+    assert blocks[block_by_label(blocks, 'x == 3')]['false'] == b
+    assert blocks[a]['next'] == b
+    assert blocks[b]['next'] == c
+    assert blocks[c]['next'] == 'end'
+    assert blocks[d]['next'] == 'end'
+
+
+def test_empty_default_goes_where_it_falls():
+    blocks = flowchart('switch (x) { case 1: a(); break; default: case 2: b(); }')
+    assert blocks[block_by_label(blocks, 'x == 2')]['false'] == block_by_label(blocks, 'b()')
+    assert reachable(blocks) == set(blocks)
+
+
+def test_default_with_only_break():
+    blocks = flowchart('switch (x) { case 1: a(); break; default: break; }\ny();')
+    assert blocks[block_by_label(blocks, 'x == 1')]['false'] == block_by_label(blocks, 'y()')
+    assert not any(block_id.startswith('default') for block_id in blocks)
+
+
+def test_endless_loop_that_breaks_draws_nothing():
+    blocks = flowchart('a();\nfor (;;) { break; }\nb();')
+    assert blocks[block_by_label(blocks, 'a()')]['next'] == block_by_label(blocks, 'b()')
+    assert reachable(blocks) == set(blocks)
+
+
+def test_break_before_update_drops_the_update():
+    blocks = flowchart('for (;x;x++) { break; }')
+    assert all(block.get('label') != 'x++' for block in blocks.values())
+    assert reachable(blocks) == set(blocks)
+
+
+def test_empty_endless_loop_loops_on_itself():
+    blocks = flowchart('for (;;) {}')
+    head = block_by_label(blocks, 'for (;;)')
+    assert blocks['start']['next'] == head
+    assert blocks[head]['next'] == head
+
+
+def test_do_while_enters_a_default_first_switch_at_its_first_case():
+    blocks = flowchart('do { switch (x) { default: a(); break; case 1: b(); break; } } while (y);')
+    case = block_by_label(blocks, 'x == 1')
+    loop = block_by_label(blocks, 'y')
+    assert blocks['start']['next'] == case
+    assert blocks[loop]['true'] == case
+    assert blocks[block_by_label(blocks, 'a()')]['next'] == loop
+
+
+def test_endless_loop_enters_a_default_first_switch_at_its_first_case():
+    blocks = flowchart('for (;;) { switch (x) { default: a(); break; case 1: b(); break; } }')
+    case = block_by_label(blocks, 'x == 1')
+    assert blocks['start']['next'] == case
+    assert blocks[block_by_label(blocks, 'a()')]['next'] == case
+    assert blocks[block_by_label(blocks, 'b()')]['next'] == case
+
+
+def test_do_while_that_breaks_draws_no_condition():
+    blocks = flowchart('do { break; } while (y);\nb();')
+    assert all(block.get('condition') != 'y' for block in blocks.values())
+    assert blocks['start']['next'] == block_by_label(blocks, 'b()')
+    assert reachable(blocks) == set(blocks)
+
+
+def test_loop_head_skips_statements_that_draw_nothing():
+    blocks = flowchart('for (;;) { int k; for (;;) { break; } a(); }')
+    a = block_by_label(blocks, 'a()')
+    assert blocks['start']['next'] == a
+    assert blocks[a]['next'] == a
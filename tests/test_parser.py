@@ -0,0 +1,25 @@
+import io
+import json
+
+import pytest
+
+from parser.parser import parse, parserCPP_to_stream, tree_to_json, write_tree
+
+
+with open('data/test.cpp', 'rb') as f:
+    SOURCE = f.read()
+
+
+@pytest.mark.parametrize('indent', [None, 4])
+@pytest.mark.parametrize('compact', [False, True])
+@pytest.mark.parametrize('named_only, ranges, max_depth', [(False, False, None), (True, True, None), (False, True, 2)])
+def test_streamed_tree_equals_json_dump(named_only, ranges, max_depth, compact, indent):
+    options = dict(named_only=named_only, ranges=ranges, max_depth=max_depth, compact=compact)
+    fp = io.StringIO()
+    parserCPP_to_stream(SOURCE, fp, indent=indent, **options)
+    assert fp.getvalue() == json.dumps(tree_to_json(parse(SOURCE).root_node, **options), indent=indent, ensure_ascii=False)
+
+
+def test_compact_has_no_ndjson_form():
+    with pytest.raises(ValueError):
+        write_tree(parse(SOURCE).root_node, io.StringIO(), compact=True, ndjson=True)
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from server import RenderServer
+
+
+@pytest.mark.parametrize('max_depth', ['x', '-1', '1.5', '²'])
+def test_bad_max_depth_is_a_bad_request(max_depth):
+    async def request():
+        server = RenderServer(jobs=1)
+        try:
+            return await server.dispatch('POST', f'/ast?max_depth={max_depth}', b'int x;')
+        finally:
+            server.close()
+
+    status, _, body = asyncio.run(request())
+    assert status == 400
+    assert body == b'max_depth must be a whole number\n'
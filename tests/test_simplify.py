@@ -0,0 +1,157 @@
+import random
+import re
+
+import pytest
+
+from parser.simplify import BASE_TYPES, TypeNames, collapse_operator_spaces, pointers_to_indexes, replace_abs
+
+
+TYPEDEFS = ['num', 'strin', 'matrix', 'integer', 'nu', 't0']
+
+
+class AlternationTypes:
+    # the regexes TypeNames replaced: one alternation over every type, rebuilt for each new typedef
+
+    def __init__(self, typedefs, save_pointer):
+        types = f'(?:{"|".join(BASE_TYPES + tuple(typedefs))})'
+        type_links = types + (r'(?: (\*|&)+| |(\*|&)+ )' if not save_pointer else ' ?')
+        self.declaration = re.compile(fr'^\s*{type_links}\w+(?:,\s(?:{type_links})?\w+)*$')
+        self.type_names = re.compile(fr'(?<!typedef\s){type_links}')
+
+    def strip(self, line):
+        return self.type_names.sub('', line)
+
+    def is_declaration(self, line):
+        return self.declaration.match(line) is not None
+
+
+LINES = [
+    # a type ending a longer word loses that suffix, a whole word after `typedef ` is kept
+    'point x',
+    'integer* p',
+    'printnum a',
+    'typedef int num',
+    'typedef num* integer',
+    'typedefnum x',
+    '1typedef  num y',
+    # declarations with and without types on every item
+    'int a, b',
+    'num* p, int q',
+    'num a, strin* b, c',
+    'int a,b',
+    'num a, 0',
+    # PTR keeps pointer marks and strips types anywhere inside a word
+    'int* a, num& b',
+    'xnumy = 0',
+    'constint t0t0',
+    'f(strin s, int &k)',
+]
+
+
+@pytest.mark.parametrize('save_pointer', [False, True])
+@pytest.mark.parametrize('line', LINES)
+def test_type_names_match_the_alternation(line, save_pointer):
+    old, new = AlternationTypes(TYPEDEFS, save_pointer), TypeNames(TYPEDEFS, save_pointer)
+    assert new.strip(line) == old.strip(line)
+    assert new.is_declaration(line) == old.is_declaration(line)
+
+
+@pytest.mark.parametrize('save_pointer', [False, True])
+def test_type_names_match_the_alternation_on_random_lines(save_pointer):
+    rng = random.Random(1)
+    alphabet = ['int', 'num', 'strin', 'x', 'y', 'a1', 'print', 'integer', 'typedef', 'const', 'nu', 't0', 'point', 'f',
+                ' ', ' ', ' ', '*', '&', ', ', ',', '(', ')', '=', '0', '\t', 'calc', 'double']
+    old, new = AlternationTypes(TYPEDEFS, save_pointer), TypeNames(TYPEDEFS, save_pointer)
+    for _ in range(20000):
+        line = rng.choice(['', '  ', '0', '1']) + ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 8)))
+        assert new.strip(line) == old.strip(line), line
+        assert new.is_declaration(line) == old.is_declaration(line), line
+
+
+# the fixpoint loops the one-pass scanners replaced
+
+def rescanning_abs(string):
+    while re.search(r'f?abs\(', string):
+        start = end = None
+        counter = 0
+        for indx, i in enumerate(string):
+            if string[indx - 5:indx] == 'fabs(' or string[indx - 4:indx] == 'abs(' or string[indx] in (')', '('):
+                if string[indx - 5:indx] == 'fabs(' or string[indx - 4:indx] == 'abs(':
+                    counter = 1
+                    start = indx
+                elif string[indx] != ')':
+                    counter += 1
+                else:
+                    counter -= 1
+                if i == ')' and counter == 0:
+                    end = indx
+                    break
+        if not (start is None or end is None):
+            string = string[:start - 4 - (string[start - 5:start] == 'fabs(')] + '|' + string[start:end] + '|' + string[end + 1:]
+        else:
+            break
+    return string
+
+
+OPERATOR_SPACES = re.compile(r'(\w+|\)|\||\])\s([\/\*\+\-=<>]=?|\&\&|\|\|)\s(\w+|\(|\||√|\[)')
+
+
+def rescanning_operator_spaces(string):
+    while True:
+        string, count = OPERATOR_SPACES.subn(r'\1\2\3', string)
+        if not count:
+            return string
+
+
+def rescanning_pointers(string):
+    # never stops on a *( it cannot convert, such as *(p), so only convertible lines are compared
+    while string.count('*(') > len(re.findall(r'[^\s\(]\*\(', string)):
+        string = re.sub(r'(?<!\*)\(([^\(\)]*?)\)', r'OPENscope\1CLOSEscope', string)
+        string = re.sub(r'\*\((\w+(?:\[.+?\])*)\+(.+?)\)', r'\1[\2]', string)
+        string = string.replace('OPENscope', '(').replace('CLOSEscope', ')')
+    return string
+
+
+@pytest.mark.parametrize('line', [
+    'abs(x)', 'fabs(a-b)+abs(c)', 'abs(abs(x)-1)', 'f(abs(x))', 'abs(f(x))+1', '(abs(x))', 'abs(x', 'x = 1',
+])
+def test_abs_scanner_matches_the_loop(line):
+    assert replace_abs(line) == rescanning_abs(line)
+
+
+@pytest.mark.parametrize('line', [
+    'a + b + c', 'x = a * b', 'i <= n && j >= 0', 'a  + b', '(a) - [b]', 'x += 1', '|x| / √y', 'a - -b',
+    'a = b = c', 'return a + b', '4if x > 0',
+])
+def test_operator_scanner_matches_the_loop(line):
+    assert collapse_operator_spaces(line) == rescanning_operator_spaces(line)
+
+
+def test_operator_scanner_matches_the_loop_on_random_lines():
+    rng = random.Random(2)
+    alphabet = ['a', 'b1', '_', '0', ' ', ' ', '\t', '+', '-', '*', '/', '=', '<', '>', '&', '|', '(', ')', '[', ']', '√']
+    for _ in range(20000):
+        line = ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 12)))
+        assert collapse_operator_spaces(line) == rescanning_operator_spaces(line), line
+
+
+@pytest.mark.parametrize('line', [
+    '*(a+i)', '*(*(a+i)+j)', '*(a[i]+j)', 'y = *(a+i+1)', 'f(*(a+i))', 'if (*(a+i)>0)', 'return *(a+i)', 'x*(a+b)',
+])
+def test_pointer_scanner_matches_the_loop(line):
+    assert pointers_to_indexes(line) == rescanning_pointers(line)
+
+
+def test_abs_pairs_parentheses_inside_the_call():
+    assert rescanning_abs('abs((a+b)*c)') == '|(a+b|*c)'
+    assert replace_abs('abs((a+b)*c)') == '|(a+b)*c|'
+
+
+def test_dereference_right_after_assignment_becomes_an_index():
+    assert rescanning_pointers('x=*(a+i)') == 'x=*(a+i)'
+    assert pointers_to_indexes('x=*(a+i)') == 'x=a[i]'
+
+
+def test_unconvertible_dereference_is_kept():
+    assert pointers_to_indexes('*(p)') == '*(p)'
+    assert pointers_to_indexes('x*(a+b)') == 'x*(a+b)'
@@ -0,0 +1,38 @@
+import json
+
+from tiles import collapse_sequences, lod_levels
+
+
+def test_chain_right_after_start_is_collapsed():
+    flowchart = {
+        "start": {"type": "start", "label": "Начало", "next": "a"},
+        "a": {"type": "operation", "label": "a", "next": "b"},
+        "b": {"type": "operation", "label": "b", "next": "c"},
+        "c": {"type": "operation", "label": "c", "next": "end"},
+        "end": {"type": "end", "label": "Конец"},
+    }
+    collapsed = collapse_sequences(flowchart)
+    assert list(collapsed) == ["start", "a", "end"]
+    assert collapsed["start"]["next"] == "a"
+    assert collapsed["a"] == {"type": "operation", "label": "a … c (3)", "next": "end"}
+
+
+def test_chain_after_a_decision_starts_at_its_first_operation():
+    flowchart = {
+        "start": {"type": "start", "next": "d"},
+        "d": {"type": "decision", "condition": "x", "true": "a", "false": "end"},
+        "a": {"type": "operation", "label": "a", "next": "b"},
+        "b": {"type": "operation", "label": "b", "next": "end"},
+        "end": {"type": "end"},
+    }
+    collapsed = collapse_sequences(flowchart)
+    assert "b" not in collapsed
+    assert collapsed["a"]["label"] == "a … b (2)"
+
+
+def test_sample_chart_collapses_the_chain_after_start_with_its_loop():
+    with open("data/data.json", encoding="utf-8") as f:
+        json_data = json.load(f)
+    flowchart = lod_levels(json_data)[-1]["flowchart"]
+    assert flowchart["start"]["next"] == "sort_loop_init"
+    assert flowchart["sort_loop_init"]["next"] == "reverse_check"
@@ -0,0 +1,283 @@
+import argparse
+import html
+import json
+import math
+import os
+
+from drow import FlowchartRenderer
+
+
+def _links(block_data):
+    """Id блоков, на которые ведут связи блока"""
+    return [block_data[key] for key in ("next", "true", "false") if key in block_data]
+
+
+def _predecessors(flowchart):
+    predecessors = {block_id: [] for block_id in flowchart}
+    for block_id, block_data in flowchart.items():
+        for target in _links(block_data):
+            if target in predecessors and block_id not in predecessors[target]:
+                predecessors[target].append(block_id)
+    return predecessors
+
+
+def collapse_sequences(flowchart):
+    """Цепочки операций без ветвлений и входов сбоку сворачиваются в один блок"""
+    predecessors = _predecessors(flowchart)
+
+    def follows(block_id):
+        # Следующий блок цепочки, если он продолжает её; цепочку продолжает только операция после операции
+        if flowchart[block_id]["type"] != "operation":
+            return None
+        target = flowchart[block_id].get("next")
+        if target in flowchart and flowchart[target]["type"] == "operation" and predecessors[target] == [block_id]:
+            return target
+        return None
+
+    # Цепочка начинается с операции, которая ничью цепочку не продолжает
+    chains = {}
+    absorbed = set()
+    for block_id, block_data in flowchart.items():
+        if block_data["type"] != "operation" or any(follows(source) == block_id for source in predecessors[block_id]):
+            continue
+        chain = chains[block_id] = [block_id]
+        target = follows(block_id)
+        while target is not None and target != block_id:
+            chain.append(target)
+            target = follows(target)
+        absorbed.update(chain[1:])
+
+    collapsed = {}
+    for block_id, block_data in flowchart.items():
+        chain = chains.get(block_id, ())
+        if block_id in absorbed:
+            continue
+        if len(chain) < 2:
+            collapsed[block_id] = dict(block_data)
+            continue
+        last = flowchart[chain[-1]]
+        summary = {"type": "operation", "label": f'{block_data.get("label", "")} … {last.get("label", "")} ({len(chain)})'}
+        if "next" in last:
+            summary["next"] = last["next"]
+        collapsed[block_id] = summary
+    return collapsed
+
+
+def _back_edges(flowchart):
+    """Обратные дуги обхода в глубину от start, как их видит укладка"""
+    back_edges = []
+    state = {}
+    roots = ["start"] if "start" in flowchart else []
+    roots += [block_id for block_id in flowchart if block_id != "start"]
+    for root in roots:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(_links(flowchart[root])))]
+        while stack:
+            block_id, targets = stack[-1]
+            for target in targets:
+                if target not in flowchart:
+                    continue
+                if target not in state:
+                    state[target] = 1
+                    stack.append((target, iter(_links(flowchart[target]))))
+                    break
+                if state[target] == 1:
+                    back_edges.append((block_id, target))
+            else:
+                state[block_id] = 2
+                stack.pop()
+    return back_edges
+
+
+def collapse_loops(flowchart):
+    """Внешние циклы с одним входом и одним выходом сворачиваются в один блок"""
+    predecessors = _predecessors(flowchart)
+
+    # Тело цикла - блоки, из которых без заголовка доходим до обратной дуги
+    loops = {}
+    for source, head in _back_edges(flowchart):
+        body = loops.setdefault(head, {head})
+        stack = [source]
+        while stack:
+            block_id = stack.pop()
+            if block_id not in body:
+                body.add(block_id)
+                stack.extend(predecessors[block_id])
+
+    collapsed = {block_id: dict(block_data) for block_id, block_data in flowchart.items()}
+    for head, body in sorted(loops.items(), key=lambda item: -len(item[1])):
+        if head not in collapsed or not body <= collapsed.keys() or body & {"start", "end"}:
+            continue
+        entries = {source for block_id in body - {head} for source in predecessors[block_id] if source not in body}
+        exits = {target for block_id in body for target in _links(collapsed[block_id]) if target not in body}
+        if entries or len(exits) != 1:
+            continue
+
+        condition = collapsed[head].get("condition") if collapsed[head]["type"] == "decision" else None
+        label = f"Цикл {condition}" if condition else "Цикл"
+        for block_id in body - {head}:
+            del collapsed[block_id]
+        collapsed[head] = {"type": "operation", "label": f"{label} ({len(body)})", "next": exits.pop()}
+    return collapsed
+
+
+def lod_levels(json_data, levels=3):
+    """Уровни детализации: полная схема, свёрнутые цепочки операций, свёрнутые циклы"""
+    flowchart = json_data["flowchart"]
+    flowcharts = [flowchart]
+    for level in range(1, levels):
+        flowchart = collapse_sequences(flowchart) if level == 1 else collapse_sequences(collapse_loops(flowchart))
+        # Уровень, ничего не свернувший, не нужен
+        if len(flowchart) < len(flowcharts[-1]):
+            flowcharts.append(flowchart)
+    return [dict(json_data, flowchart=flowchart) for flowchart in flowcharts]
+
+
+def write_tiles(json_data, directory, tile_size=1024, levels=3, renderer_class=FlowchartRenderer):
+    """Пишет схему плитками tile_size x tile_size по уровням детализации и manifest.json с их границами"""
+    manifest = {
+        "function": json_data.get("function", {}).get("name", ""),
+        "tile_size": tile_size,
+        "levels": [],
+    }
+    for level, level_data in enumerate(lod_levels(json_data, levels)):
+        renderer = renderer_class(level_data)
+        renderer.layout()
+        width, height = renderer.size()
+
+        # На уровне level плитка того же размера в пикселях покрывает в 2**level раз большую область
+        scale = 0.5 ** level
+        span = tile_size / scale
+        os.makedirs(os.path.join(directory, str(level)), exist_ok=True)
+        tiles = []
+        for row in range(math.ceil(height / span)):
+            for column in range(math.ceil(width / span)):
+                viewport = (column * span, row * span, (column + 1) * span, (row + 1) * span)
+                blocks, routes = renderer.visible(*viewport)
+                if not blocks and not routes:
+                    continue
+                name = f"{level}/{column}_{row}.svg"
+                with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+                    renderer.render_to(f, relayout=False, viewport=viewport, scale=scale)
+                tiles.append({"column": column, "row": row, "file": name, "bounds": list(viewport), "blocks": len(blocks)})
+
+        manifest["levels"].append({
+            "level": level,
+            "scale": scale,
+            "blocks": len(renderer.blocks),
+            "width": width,
+            "height": height,
+            "span": span,
+            "tiles": tiles,
+        })
+
+    with open(os.path.join(directory, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    with open(os.path.join(directory, "index.html"), "w", encoding="utf-8") as f:
+        f.write(VIEWER_HTML.replace("{title}", html.escape(manifest["function"])))
+    return manifest
+
+
+# Просмотрщик: грузит только видимые плитки уровня, подходящего к текущему масштабу
+VIEWER_HTML = '''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Блок-схема {title}</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 0; }
+        #toolbar { padding: 8px 20px; }
+        #view { position: absolute; top: 40px; bottom: 0; left: 0; right: 0; overflow: auto; }
+        #plane { position: relative; }
+        #plane img { position: absolute; }
+    </style>
+</head>
+<body>
+    <div id="toolbar">
+        <button id="out">−</button> <button id="in">+</button> <span id="zoom"></span>
+    </div>
+    <div id="view"><div id="plane"></div></div>
+    <script>
+        const view = document.getElementById("view");
+        const plane = document.getElementById("plane");
+        let manifest = null, zoom = 1, level = null, loaded = {};
+
+        function pickLevel() {
+            // Самый подробный уровень, чей масштаб не больше текущего
+            const fitting = manifest.levels.filter(item => item.scale <= zoom);
+            return fitting.length ? fitting[0] : manifest.levels[manifest.levels.length - 1];
+        }
+
+        function update() {
+            const next = pickLevel();
+            if (next !== level) {
+                level = next;
+                loaded = {};
+                plane.innerHTML = "";
+            }
+            plane.style.width = level.width * zoom + "px";
+            plane.style.height = level.height * zoom + "px";
+            document.getElementById("zoom").textContent = Math.round(zoom * 100) + "% · уровень " + level.level;
+
+            const left = view.scrollLeft / zoom, top = view.scrollTop / zoom;
+            const right = left + view.clientWidth / zoom, bottom = top + view.clientHeight / zoom;
+            for (const tile of level.tiles) {
+                const [x0, y0, x1, y1] = tile.bounds;
+                let img = loaded[tile.file];
+                if (!img && x0 <= right && left <= x1 && y0 <= bottom && top <= y1) {
+                    img = loaded[tile.file] = document.createElement("img");
+                    img.src = tile.file;
+                    plane.appendChild(img);
+                }
+                if (img) {
+                    img.style.left = x0 * zoom + "px";
+                    img.style.top = y0 * zoom + "px";
+                    img.style.width = (x1 - x0) * zoom + "px";
+                }
+            }
+        }
+
+        function setZoom(factor) {
+            zoom = Math.min(4, Math.max(1 / 64, zoom * factor));
+            update();
+        }
+
+        document.getElementById("in").onclick = () => setZoom(2);
+        document.getElementById("out").onclick = () => setZoom(0.5);
+        view.addEventListener("scroll", update);
+        window.addEventListener("resize", update);
+        fetch("manifest.json").then(response => response.json()).then(data => { manifest = data; update(); });
+    </script>
+</body>
+</html>
+'''
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description="Write flowcharts as tiles with a manifest and a viewer")
+    arguments.add_argument("source", help="flowchart JSON or a C++ source, one chart per function")
+    arguments.add_argument("-o", "--output", default="output/tiles", help="directory for tiles")
+    arguments.add_argument("--tile-size", type=int, default=1024, help="tile side in pixels")
+    arguments.add_argument("--levels", type=int, default=3, help="levels of detail, the full chart included")
+    args = arguments.parse_args(argv)
+
+    if args.source.endswith(".json"):
+        with open(args.source, encoding="utf-8") as f:
+            charts = [json.load(f)]
+    else:
+        from parser.flowchart import build_flowcharts
+
+        with open(args.source, "rb") as f:
+            charts = build_flowcharts(f.read())
+
+    for json_data in charts:
+        directory = args.output if len(charts) == 1 else os.path.join(args.output, json_data["function"]["name"])
+        manifest = write_tiles(json_data, directory, args.tile_size, args.levels)
+        summary = ", ".join(f'{level["blocks"]} блоков / {len(level["tiles"])} плиток' for level in manifest["levels"])
+        print(f"{directory}: {summary}")
+
+
+if __name__ == "__main__":
+    main()
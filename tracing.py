@@ -0,0 +1,118 @@
+import atexit
+import contextlib
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+
+
+# the active Tracer, None keeps every hook down to one global lookup
+_tracer = None
+_disabled = contextlib.nullcontext()
+
+
+class Tracer:
+    """Collects Chrome trace events: spans as complete events, counters and memory as counter events"""
+
+    def __init__(self, memory=False):
+        self.events = []
+        self.counters = defaultdict(int)
+        self.memory = memory
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self.peak_memory = 0
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def now(self):
+        return (time.perf_counter_ns() - self.origin) / 1000
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        started = self.now()
+        try:
+            yield self
+        finally:
+            self.complete(name, started, self.now() - started, **args)
+            self.sample(self.now())
+
+    def complete(self, name, started, duration, **args):
+        event = {'name': name, 'ph': 'X', 'ts': started, 'dur': duration, 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def sample(self, ts):
+        # counters and memory are snapshotted at the end of every span, spans are coarse enough for that
+        if self.counters:
+            self.events.append({'name': 'counters', 'ph': 'C', 'ts': ts, 'pid': self.pid, 'args': dict(self.counters)})
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = max(self.peak_memory, peak)
+            self.events.append({'name': 'memory', 'ph': 'C', 'ts': ts, 'pid': self.pid, 'args': {'current': current, 'peak': peak}})
+
+    def export(self, path):
+        trace = {
+            'traceEvents': self.events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'counters': dict(self.counters), 'peak_memory': self.peak_memory},
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f, ensure_ascii=False)
+
+
+def enable(memory=False):
+    global _tracer
+    _tracer = Tracer(memory)
+    return _tracer
+
+
+def disable():
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def active():
+    return _tracer
+
+
+def span(name, **args):
+    return _tracer.span(name, **args) if _tracer is not None else _disabled
+
+
+def count(name, value=1):
+    if _tracer is not None:
+        _tracer.counters[name] += value
+
+
+def now():
+    return _tracer.now() if _tracer is not None else 0
+
+
+def rule_spans(rules, started):
+    # the simplify passes run fused line by line, so each one is shown as a single span of its summed time
+    if _tracer is None:
+        return
+    for name, seconds, hits in rules:
+        duration = seconds * 1e6
+        _tracer.complete(f'rule: {name}', started, duration, hits=hits, aggregated=True)
+        started += duration
+
+
+def enable_from_environment():
+    # SCHEME_TRACE=trace.json traces any entry point and writes the file at exit
+    path = os.environ.get('SCHEME_TRACE')
+    if not path or _tracer is not None:
+        return
+    enable(memory=os.environ.get('SCHEME_TRACE_MEMORY') == '1')
+    tracer = _tracer
+    atexit.register(tracer.export, path)
+
+
+enable_from_environment()